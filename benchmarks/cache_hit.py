@@ -0,0 +1,68 @@
+"""
+simplecache hit cost, run from the repo root: python -m benchmarks.cache_hit
+
+Every case is timed twice through the same wrapper: with the key builder simplecache picks
+for the function and with the json + md5 key every hit used to build.
+"""
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from hashlib import md5
+from typing import Hashable
+
+from voice_bot.misc.simple_cache import SimpleCache
+
+HITS = 100_000
+
+
+def legacy_key(args: tuple, kwargs: dict) -> Hashable:
+    args_dumped = json.dumps(args, default=str) + json.dumps(kwargs, default=str)
+    return md5(args_dumped.encode("utf-8")).hexdigest()
+
+
+def make_cases(cache: SimpleCache, prefix: str, key_builder) -> dict:
+    class Sheets:
+        @cache.cache_decorator(f"{prefix}.templates", timedelta(days=1), key_builder=key_builder)
+        async def get_templates(self) -> dict[str, str]:
+            return {}
+
+        @cache.cache_decorator(f"{prefix}.worksheet", timedelta(days=1), key_builder=key_builder)
+        async def get_worksheet(self, title: str) -> str:
+            return title
+
+        @cache.cache_decorator(f"{prefix}.schedule", timedelta(days=1), key_builder=key_builder)
+        async def get_schedule(self, title: str, monday: datetime = None) -> str:
+            return title
+
+        @cache.cache_decorator(f"{prefix}.unhashable", timedelta(days=1), key_builder=key_builder)
+        async def get_rows(self, columns: list[int]) -> int:
+            return len(columns)
+
+    sheets, monday = Sheets(), datetime(2024, 1, 1)
+    return {
+        "no args (templates)": sheets.get_templates,
+        "one str arg (worksheet)": lambda: sheets.get_worksheet("Ученики"),
+        "str + datetime kwarg": lambda: sheets.get_schedule("Стандарт", monday=monday),
+        "unhashable arg": lambda: sheets.get_rows([1, 2]),
+    }
+
+
+async def per_hit(call) -> float:
+    await call()
+    started = time.perf_counter()
+    for _ in range(HITS):
+        await call()
+    return (time.perf_counter() - started) / HITS
+
+
+async def main():
+    cache = SimpleCache()
+    legacy, typed = make_cases(cache, "legacy", legacy_key), make_cases(cache, "typed", None)
+    for name in typed:
+        before, after = await per_hit(legacy[name]), await per_hit(typed[name])
+        print(f"{name:<24} json+md5 {before * 1_000_000:5.2f}us, typed key {after * 1_000_000:5.2f}us")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
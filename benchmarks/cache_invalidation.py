@@ -0,0 +1,60 @@
+"""
+simplecache namespace invalidation, run from the repo root: python -m benchmarks.cache_invalidation
+
+The baseline is the flat cache delete_key used to scan: every key checked with startswith
+and every match deleted. delete_key now swaps the namespace containers, that is timed apart
+from releasing the dropped entries, which costs the same whichever way they are dropped.
+"""
+import asyncio
+import time
+from dataclasses import replace
+from datetime import timedelta
+
+from voice_bot.misc.simple_cache import SimpleCache
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+async def measure(size: int) -> tuple[float, float, float]:
+    cache = SimpleCache()
+
+    class Claims:
+        @cache.cache_decorator("role_claim", timedelta(hours=1), max_size=size)
+        async def check(self, chat_id: str) -> bool:
+            return True
+
+    claims = Claims()
+    for i in range(size):
+        await claims.check(str(i))
+
+    namespace = cache._namespaces["role_claim"]
+    # copies, so the baseline releases its entries too
+    flat = {f"role_claim:{key}": replace(entry) for key, entry in namespace.entries.items()}
+    started = time.perf_counter()
+    for key in [key for key in flat if key.startswith("role_claim")]:
+        del flat[key]
+    scan = time.perf_counter() - started
+    assert not flat
+
+    dropped = namespace.entries, namespace._expirations
+    started = time.perf_counter()
+    cache.delete_key("role_claim")
+    invalidate = time.perf_counter() - started
+    assert not namespace.entries, "delete_key left entries behind"
+
+    started = time.perf_counter()
+    del dropped
+    release = time.perf_counter() - started
+
+    return scan, invalidate, release
+
+
+async def main():
+    for size in SIZES:
+        scan, invalidate, release = await measure(size)
+        print(f"{size:>7} entries: prefix scan {scan * 1000:7.2f}ms, "
+              f"delete_key {invalidate * 1_000_000:5.1f}us + releasing entries {release * 1000:6.2f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Schedule grid parsing, run from the repo root: python -m benchmarks.schedule_grid
+
+Parses a random 52-week grid with 12 slots a day, in list and in by-user dict mode. The baseline
+is the parser the schedule table service had before, both outputs are checked to be the same.
+"""
+import random
+import timeit
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+from voice_bot.spreadsheets.google_cloud.google_schedule_table import GoogleScheduleTableService
+from voice_bot.spreadsheets.models.spreadsheet_schedule_record import SpreadsheetScheduleRecord
+
+WEEKS = 52
+
+REPEATS = 50
+
+SLOTS = [f"{9 + i}:00-{9 + i}:45" for i in range(12)]
+
+USERS = [f"user{i}" for i in range(60)]
+
+
+def random_week(rnd: random.Random, monday: datetime) -> list[list[str]]:
+    grid = [["", "пн", "вт", "ср", "чт", "пт", "сб", "вс"], ["", f"{monday:%d.%m.%Y}"]]
+    for slot in SLOTS:
+        row = [slot] + [
+            rnd.choice(USERS) + (" (онлайн)" if rnd.random() < .2 else "") if rnd.random() < .6 else ""
+            for _ in range(7)
+        ]
+        while len(row) > 1 and not row[-1]:
+            row.pop()
+        grid.append(row)
+    return grid
+
+
+def legacy_parse(values: list[list[str]], table_name: str, monday: datetime | None = None, get_dict: bool = True):
+    if monday:
+        monday = monday - timedelta(days=monday.weekday())
+
+    res = {} if get_dict else list[SpreadsheetScheduleRecord]()
+    for row in values[2:]:
+        times = row[0].split("-")
+        start_time, end_time = times[0], times[1]
+
+        for day, lesson in enumerate(row[1:]):
+            if not lesson:
+                continue
+
+            lesson_split = lesson.split()
+            if monday:
+                hours, minutes = list(map(int, start_time.split(':')))
+                day_start = monday + timedelta(days=day)
+                start = datetime(year=day_start.year, month=day_start.month, day=day_start.day,
+                                 hour=hours, minute=minutes)
+            else:
+                start = None
+            record = SpreadsheetScheduleRecord(
+                table_name=table_name,
+                user_id=lesson_split[0],
+                raw_time_start_time_end=row[0],
+                time_start=start_time,
+                time_end=end_time,
+                day_of_the_week=day + 1,
+                absolute_start_time=start,
+                is_online=len(lesson_split) > 1,
+            )
+
+            if get_dict:
+                res.setdefault(record.user_id, []).append(record)
+                continue
+            res.append(record)
+
+    if get_dict:
+        for key in res:
+            res[key].sort(key=lambda x: x.day_of_the_week)
+    return res
+
+
+def as_plain(parsed):
+    if isinstance(parsed, dict):
+        return {user: [asdict(record) for record in records] for user, records in parsed.items()}
+    return [asdict(record) for record in parsed]
+
+
+def main():
+    rnd = random.Random(1)
+    mondays = [datetime(2024, 1, 1) + timedelta(weeks=week) for week in range(WEEKS)]
+    weeks = [(f"{monday:%d.%m}", monday, random_week(rnd, monday)) for monday in mondays]
+    # the parser does not touch the client
+    service = GoogleScheduleTableService.__new__(GoogleScheduleTableService)
+    records = sum(len(service._parse_schedule_values(grid, name, monday, False)) for name, monday, grid in weeks)
+
+    for get_dict in (False, True):
+        for name, monday, grid in weeks:
+            assert as_plain(legacy_parse(grid, name, monday, get_dict)) == \
+                   as_plain(service._parse_schedule_values(grid, name, monday, get_dict)), (name, get_dict)
+
+        # interleaved, so a noisy stretch of the machine hits both
+        before, after = float("inf"), float("inf")
+        for _ in range(REPEATS):
+            before = min(before, timeit.timeit(
+                lambda: [legacy_parse(grid, name, monday, get_dict) for name, monday, grid in weeks], number=1))
+            after = min(after, timeit.timeit(
+                lambda: [service._parse_schedule_values(grid, name, monday, get_dict) for name, monday, grid in weeks],
+                number=1))
+        print(f"{'by user' if get_dict else 'list':<8} {WEEKS} weeks, {records} records: "
+              f"before {before * 1000:6.2f}ms, after {after * 1000:6.2f}ms (x{before / after:.2f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Sync data access with thousands of lessons, run from the repo root: python -m benchmarks.sync_bulk
+
+Writes lessons for 300 users one session.add / session.delete per row and through BulkWriter,
+then loads them back with the user joined and selected in. SQLite in memory, the sync runs the
+same statements against postgres.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import joinedload, selectinload
+
+from voice_bot.db.base_model import BaseModel
+from voice_bot.db.bulk import BulkWriter
+from voice_bot.db.enums import DumpStates, ScheduleRecordType, YesNo
+from voice_bot.db.models import User, ScheduleRecord
+
+USERS = 300
+
+LESSONS = (1_000, 5_000)
+
+
+class Statements:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def lesson_values(i: int) -> dict:
+    return dict(
+        absolute_start_time=datetime(2024, 1, 1, 9) + timedelta(days=i // 12, hours=i % 12),
+        time_start=f"{9 + i % 12}:00",
+        time_end=f"{9 + i % 12}:45",
+        type=ScheduleRecordType.OFFLINE,
+        dump_state=DumpStates.ACTIVE,
+    )
+
+
+async def timed(statements: Statements, action) -> tuple[float, int]:
+    before, started = statements.count, time.perf_counter()
+    await action()
+    return time.perf_counter() - started, statements.count - before
+
+
+async def measure(lessons: int):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+    sessions = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+    statements = Statements(engine)
+
+    async with sessions() as session:
+        session.add_all([User(unique_name=f"user{i}", fullname=f"User {i}", secret_code=None,
+                              is_admin=YesNo.NO, dump_state=DumpStates.ACTIVE) for i in range(USERS)])
+        await session.commit()
+        users = list(await session.scalars(select(User)))
+
+        async def add_per_row():
+            session.add_all([ScheduleRecord(user=users[i % USERS], **lesson_values(i)) for i in range(lessons)])
+            await session.commit()
+
+        async def delete_per_row():
+            for lesson in await session.scalars(select(ScheduleRecord)):
+                await session.delete(lesson)
+            await session.commit()
+
+        async def insert_bulk():
+            bulk = BulkWriter(session)
+            for i in range(lessons):
+                bulk.insert(ScheduleRecord, users[i % USERS], **lesson_values(i))
+            await bulk.apply()
+            await session.commit()
+
+        async def delete_bulk():
+            bulk = BulkWriter(session)
+            for lesson in await session.scalars(select(ScheduleRecord)):
+                bulk.delete(lesson)
+            await bulk.apply()
+            await session.commit()
+
+        results = {
+            "insert": [await timed(statements, add_per_row)],
+            "delete": [await timed(statements, delete_per_row)],
+        }
+        results["insert"].append(await timed(statements, insert_bulk))
+        results["delete"].append(await timed(statements, delete_bulk))
+
+        # the lessons to load
+        await insert_bulk()
+
+    for option in (joinedload, selectinload):
+        async with sessions() as session:
+            async def load():
+                await session.scalars(select(ScheduleRecord).options(option(ScheduleRecord.user)))
+            results.setdefault("load", []).append(await timed(statements, load))
+
+    await engine.dispose()
+    return results
+
+
+async def main():
+    for lessons in LESSONS:
+        results = await measure(lessons)
+        print(f"{lessons} lessons:")
+        for step, labels in (("insert", ("per row", "bulk")), ("delete", ("per row", "bulk")),
+                             ("load", ("joinedload", "selectinload"))):
+            (before, before_sql), (after, after_sql) = results[step]
+            print(f"  {step:<7} {labels[0]:<10} {before * 1000:7.1f}ms / {before_sql:>4} statements, "
+                  f"{labels[1]:<12} {after * 1000:7.1f}ms / {after_sql:>4} statements")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
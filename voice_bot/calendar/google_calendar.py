@@ -4,15 +4,25 @@ import structlog
 from gcsa.attendee import Attendee
 from gcsa.event import Event
 from gcsa.google_calendar import GoogleCalendar
+from googleapiclient.errors import HttpError
 from injector import singleton, inject
 
 from voice_bot.db.enums import ScheduleRecordType
 from voice_bot.db.models import ScheduleRecord
 from voice_bot.misc.datetime_service import DatetimeService, cut_timezone
+from voice_bot.misc.quota_scheduler import QuotaScheduler, TokenBucket
 from voice_bot.spreadsheets.google_cloud.gspread import GspreadClient
 from voice_bot.voice_bot_configurator import VoiceBotConfigurator
 
 
+def _is_retryable(e: Exception) -> bool:
+    return isinstance(e, HttpError) and (e.status_code == 429 or e.status_code >= 500)
+
+
+def _is_throttled(e: Exception) -> bool:
+    return isinstance(e, HttpError) and e.status_code == 429
+
+
 @singleton
 class GoogleCalendarService:
     @inject
@@ -21,6 +31,18 @@ class GoogleCalendarService:
         self._dt = dt
         self._conf = conf
         self._gc = GoogleCalendar(credentials_path=conf.oauth_credentials)
+        # calendar quota is not split into reads and writes
+        requests_quota = TokenBucket(conf.calendar_requests_per_minute)
+        self._scheduler = QuotaScheduler(
+            "calendar",
+            reads=requests_quota,
+            writes=requests_quota,
+            workers=conf.calendar_workers,
+            interactive_workers=conf.calendar_interactive_workers,
+            timeout=conf.google_call_timeout,
+            retryable=_is_retryable,
+            retryable_write=_is_throttled,
+        )
         self._logger = structlog.get_logger(class_name=__class__.__name__)
 
         self._events: dict[str, Event] | None = None
@@ -30,7 +52,7 @@ class GoogleCalendarService:
             return
 
         self._events = {}
-        for event in self._gc:
+        for event in await self._scheduler.run(lambda: list(self._gc)):
             if event.summary.startswith("Voice city."):
                 self._events[event.id] = event
         await self._logger.info("events fetched", count=len(self._events))
@@ -51,7 +73,7 @@ class GoogleCalendarService:
             description=await self._desc_for(lesson)
         )
         try:
-            e = self._gc.add_event(e)
+            e = await self._scheduler.run(self._gc.add_event, e, write=True)
             lesson.gc_event_id = e.event_id
             self._events[e.event_id] = e
             await self._logger.info("event created", lesson_id=lesson.id)
@@ -60,10 +82,10 @@ class GoogleCalendarService:
                 del self._events[lesson.gc_event_id]
             lesson.gc_event_id = None
 
-    def get(self, event_id: str) -> Event:
+    async def get(self, event_id: str) -> Event:
         if self._events is None:
             raise RuntimeError("events are not initialized")
-        return self._gc.get_event(event_id)
+        return await self._scheduler.run(self._gc.get_event, event_id)
 
     async def sync_event(self, lesson: ScheduleRecord):
         if self._events is None:
@@ -73,13 +95,13 @@ class GoogleCalendarService:
             await self.create(lesson)
             return
 
-        e = self.get(lesson.gc_event_id)
+        e = await self.get(lesson.gc_event_id)
         new_desc = await self._desc_for(lesson)
         new_summary = self._summary_for(lesson)
         if new_summary != e.summary or new_desc != e.description:
             e.description = new_desc
             e.summary = new_summary
-            self._gc.update_event(e)
+            await self._scheduler.run(self._gc.update_event, e, write=True)
             await self._logger.info("calendar event updated")
 
     async def clean_old_events(self, delete_before: datetime):
@@ -89,7 +111,7 @@ class GoogleCalendarService:
         for k, e in [*self._events.items()]:
             e: Event
             if cut_timezone(e.start) < delete_before:
-                self._gc.delete_event(e)
+                await self._scheduler.run(self._gc.delete_event, e, write=True)
                 del self._events[k]
                 await self._logger.info("event deleted", start=e.start)
 
@@ -0,0 +1,64 @@
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from typing import Iterable
+
+from sqlalchemy import insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from voice_bot.db.base_model import BaseModel
+from voice_bot.db.models import User
+
+# sqlite before 3.32 takes at most 999 bound parameters
+_IDS_PER_DELETE = 500
+
+
+def _chunks(ids: Iterable[int], size: int) -> Iterable[list[int]]:
+    iterator = iter(ids)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class BulkWriter:
+    """
+    Collects rows to insert and delete during a merge and applies them with one executemany INSERT and
+    one DELETE ... WHERE id IN per table, instead of a session.add or session.delete per row.
+    """
+    def __init__(self, session: AsyncSession):
+        self._session = session
+        self._inserts = defaultdict[type[BaseModel], list[tuple[User, dict]]](list)
+        self._deletes = defaultdict[type[BaseModel], set[int]](set)
+
+    def insert(self, model: type[BaseModel], user: User, **values):
+        # the user may be new, its id is known after the flush in apply
+        self._inserts[model].append((user, values))
+
+    def delete(self, record: BaseModel):
+        self._deletes[type(record)].add(record.id)
+
+    def delete_ids(self, model: type[BaseModel], ids: Iterable[int]):
+        self._deletes[model].update(ids)
+
+    def deleted_ids(self, model: type[BaseModel]) -> set[int]:
+        return self._deletes.get(model, set())
+
+    def has_changes(self) -> bool:
+        return any(self._inserts.values()) or any(self._deletes.values())
+
+    async def apply(self):
+        # ORM changes go first, inserts may reference new users and deleted rows may have pending updates
+        await self._session.flush()
+
+        for model, ids in self._deletes.items():
+            for chunk in _chunks(sorted(ids), _IDS_PER_DELETE):
+                await self._session.execute(delete(model).where(model.id.in_(chunk)))
+
+        now = datetime.now()
+        for model, rows in self._inserts.items():
+            # dataclass default factories do not run for bulk inserts
+            timestamps = {column: now for column in ("created_on", "updated_on") if column in model.__table__.c}
+            await self._session.execute(
+                insert(model), [{**timestamps, **values, "user_id": user.id} for user, values in rows])
+
+        self._inserts.clear()
+        self._deletes.clear()
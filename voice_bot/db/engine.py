@@ -3,6 +3,8 @@ import subprocess
 from injector import singleton, inject
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
+# registers the flush listener that fills the sync outbox
+from voice_bot.db import outbox  # noqa: F401
 from voice_bot.voice_bot_configurator import VoiceBotConfigurator
 
 
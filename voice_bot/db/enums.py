@@ -23,3 +23,15 @@ class UserActionType(Enum):
     LESSON = 1
     LESSON_CANCELLATION = 2
     SUBSCRIPTION = 3
+
+
+class OutboxEntity(Enum):
+    USER = 1
+    SCHEDULE = 2
+    STD_SCHEDULE = 3
+
+
+class OutboxChange(Enum):
+    CREATED = 1
+    UPDATED = 2
+    DELETED = 3
@@ -5,7 +5,7 @@ from sqlalchemy import String, ForeignKey, Enum, Integer, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from voice_bot.db.base_model import BaseModel
-from voice_bot.db.enums import ScheduleRecordType, DumpStates, YesNo, UserActionType
+from voice_bot.db.enums import ScheduleRecordType, DumpStates, YesNo, UserActionType, OutboxEntity, OutboxChange
 
 
 class User(BaseModel):
@@ -175,3 +175,16 @@ class FreeLesson(BaseModel):
     time_end: Mapped[str] = mapped_column(String(16))
 
     is_active: Mapped[YesNo] = mapped_column(Enum(YesNo))
+
+
+class SyncOutbox(BaseModel):
+    __tablename__ = "SYNC_OUTBOX"
+
+    id: Mapped[int] = mapped_column(primary_key=True, init=False)
+
+    # not a foreign key, deleted records are logged too
+    entity: Mapped[OutboxEntity] = mapped_column(Enum(OutboxEntity))
+    entity_id: Mapped[int]
+    change: Mapped[OutboxChange] = mapped_column(Enum(OutboxChange))
+
+    created_on: Mapped[datetime] = mapped_column(default_factory=datetime.now)
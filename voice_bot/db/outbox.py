@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from voice_bot.db.enums import OutboxEntity, OutboxChange
+from voice_bot.db.models import User, ScheduleRecord, StandardScheduleRecord, SyncOutbox
+
+_MUTED = "sync_outbox_muted"
+
+# only the attributes the spreadsheets show, e.g. a new calendar event id is not a change to sync
+_TRACKED = {
+    User: (OutboxEntity.USER, ("unique_name", "telegram_login")),
+    ScheduleRecord: (OutboxEntity.SCHEDULE, (
+        "user", "user_id", "absolute_start_time", "time_start", "time_end", "type", "dump_state")),
+    StandardScheduleRecord: (OutboxEntity.STD_SCHEDULE, (
+        "user", "user_id", "day_of_the_week", "time_start", "time_end", "type", "dump_state")),
+}
+
+
+@contextmanager
+def muted(session: AsyncSession):
+    """Flushes inside are not logged, the sync uses it for the changes it takes from the spreadsheets."""
+    session.info[_MUTED] = True
+    try:
+        yield
+    finally:
+        session.info.pop(_MUTED, None)
+
+
+def _changed(obj, attributes: tuple[str, ...]) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+def _log_changes(session: Session, flush_context):
+    # runs after the flush so new records already have their ids, the change lists still show what was flushed
+    if session.info.get(_MUTED):
+        return
+
+    now = datetime.now()
+    rows = list[dict]()
+    for objects, change in ((session.new, OutboxChange.CREATED),
+                            (session.dirty, OutboxChange.UPDATED),
+                            (session.deleted, OutboxChange.DELETED)):
+        for obj in objects:
+            tracked = _TRACKED.get(type(obj))
+            if not tracked or change == OutboxChange.UPDATED and not _changed(obj, tracked[1]):
+                continue
+            rows.append(dict(entity=tracked[0], entity_id=obj.id, change=change, created_on=now))
+
+    if rows:
+        session.connection().execute(insert(SyncOutbox), rows)
+
+
+event.listen(Session, "after_flush", _log_changes)
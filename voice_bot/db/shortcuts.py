@@ -5,3 +5,7 @@ _ACTIVE_DUMP_STATES = [DumpStates.ACTIVE, DumpStates.TO_SYNC]
 
 def is_active(entity):
     return entity.dump_state.in_(_ACTIVE_DUMP_STATES)
+
+
+def is_active_record(record) -> bool:
+    return record.dump_state in _ACTIVE_DUMP_STATES
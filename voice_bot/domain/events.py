@@ -0,0 +1,23 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class UserRegistered:
+    chat_id: str
+    previous_chat_id: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class SyncCompleted:
+    # chat ids of users whose name, roles or existence changed in the bot
+    changed_chat_ids: frozenset[str]
+
+
+@dataclass(frozen=True, slots=True)
+class ParamRewritten:
+    key: str
+
+
+@dataclass(frozen=True, slots=True)
+class ScheduleChanged:
+    sheet_names: frozenset[str]
@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+from typing import Collection
+
+from voice_bot.db.enums import YesNo
+from voice_bot.db.models import User
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    id: int
+    unique_name: str
+    fullname: str
+    roles: frozenset[str]
+    is_admin: bool
+
+    def has_roles(self, roles: Collection[str]) -> bool:
+        return self.roles.issuperset(roles)
+
+    @staticmethod
+    def from_user(user: User) -> "Principal":
+        return Principal(
+            id=user.id,
+            unique_name=user.unique_name,
+            fullname=user.fullname,
+            roles=frozenset(role.role_name for role in user.roles),
+            is_admin=user.is_admin == YesNo.YES,
+        )
@@ -1,17 +1,21 @@
+import structlog
 from injector import singleton, inject
 
-from voice_bot.domain.claims.role_claim import RoleClaim
 from voice_bot.misc import simple_cache
+from voice_bot.misc.simple_cache import CacheStats
 from voice_bot.spreadsheets.params_table import ParamsTableService
 from voice_bot.spreadsheets.users_table import UsersTableService
+from voice_bot.voice_bot_configurator import VoiceBotConfigurator
 
 
 @singleton
 class CacheService:
     @inject
-    def __init__(self, users: UsersTableService, params: ParamsTableService):
+    def __init__(self, users: UsersTableService, params: ParamsTableService, conf: VoiceBotConfigurator):
         self._params = params
         self._users = users
+        self._snapshot_path = conf.cache_snapshot_path
+        self._logger = structlog.get_logger(class_name=__class__.__name__)
 
     def clear_users_cache(self):
         self._users.delete_cache()
@@ -19,10 +23,29 @@ class CacheService:
     def clear_settings_cache(self):
         self._params.delete_cache()
 
-    def clear_claims_cache(self):
-        RoleClaim.delete_cache()
-
     @staticmethod
     def clear_all_cache():
         simple_cache.clear_cache()
 
+    @staticmethod
+    def get_stats() -> list[CacheStats]:
+        return simple_cache.cache_stats()
+
+    async def save_snapshot(self):
+        if not self._snapshot_path:
+            return
+
+        try:
+            simple_cache.save_snapshot(self._snapshot_path)
+        except Exception as e:
+            await self._logger.warning("cannot save cache snapshot", path=str(self._snapshot_path), exception=e)
+
+    async def load_snapshot(self):
+        if not self._snapshot_path or not self._snapshot_path.exists():
+            return
+
+        try:
+            restored = simple_cache.load_snapshot(self._snapshot_path)
+            await self._logger.info("cache snapshot loaded", entries=restored)
+        except Exception as e:
+            await self._logger.warning("cannot load cache snapshot", path=str(self._snapshot_path), exception=e)
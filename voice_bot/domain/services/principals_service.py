@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from injector import inject, singleton
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from voice_bot.db.engine import Engine
+from voice_bot.db.models import User
+from voice_bot.db.shortcuts import is_active
+from voice_bot.domain.events import UserRegistered, SyncCompleted
+from voice_bot.domain.principal import Principal
+from voice_bot.misc import simple_cache, event_bus
+from voice_bot.misc.cached import Cached
+from voice_bot.misc.simple_cache import simplecache
+
+_CACHE_KEY = "principals"
+
+
+# the load is shared by concurrent updates and can outlive the one that started it, so it runs
+# on a session of its own rather than on an update's
+@singleton
+class PrincipalsService(Cached):
+    @inject
+    def __init__(self, engine: Engine):
+        self._engine = engine
+
+    # unknown chat ids are remembered briefly, registration forgets them right away
+    @simplecache(_CACHE_KEY, lifespan=timedelta(hours=1), negative_lifespan=timedelta(minutes=5))
+    async def get_principal(self, tg_chat_id: str) -> Principal | None:
+        query = select(User).options(selectinload(User.roles)) \
+            .where((User.telegram_chat_id == tg_chat_id) & is_active(User))
+        async with self._engine.async_session() as session:
+            user = await session.scalar(query)
+        return Principal.from_user(user) if user else None
+
+    @staticmethod
+    def forget(*tg_chat_ids: str):
+        for tg_chat_id in tg_chat_ids:
+            simple_cache.delete_entry(_CACHE_KEY, tg_chat_id)
+
+    @staticmethod
+    def delete_cache():
+        simple_cache.delete_key(_CACHE_KEY)
+
+    @staticmethod
+    def subscribe_events():
+        event_bus.subscribe(
+            UserRegistered, lambda e: PrincipalsService.forget(e.chat_id, *filter(None, [e.previous_chat_id])))
+        event_bus.subscribe(SyncCompleted, lambda e: PrincipalsService.forget(*e.changed_chat_ids))
@@ -12,7 +12,8 @@ from voice_bot.db.shortcuts import is_active
 from voice_bot.db.update_session import UpdateSession
 from voice_bot.domain.services.users_service import UsersService
 from voice_bot.misc.datetime_service import DatetimeService, str_hours_from_dt, dt_fmt_rus, dt_fmt_time, \
-    to_monday_midnight, td_days_and_str_hours, to_midnight
+    to_monday_midnight, to_midnight
+from voice_bot.misc.slot_key import SlotKey, minute_of_day
 from voice_bot.spreadsheets.params_table import ParamsTableService
 from voice_bot.telegram_di_scope import telegramupdate
 
@@ -63,15 +64,13 @@ class ScheduleService:
             query = select(ScheduleRecord).options(joinedload(ScheduleRecord.user)).where(
                 ScheduleRecord.absolute_start_time.between(current_monday, next_monday))
             lessons = (await self._session.scalars(query)).all()
-            lessons_dict = \
-                {td_days_and_str_hours(lesson.absolute_start_time.weekday(), lesson.time_start): lesson for lesson in
-                 lessons}
+            lessons_dict = {SlotKey.dated(lesson.absolute_start_time): lesson for lesson in lessons}
 
             for std_lesson in std:
-                key = td_days_and_str_hours(std_lesson.day_of_the_week, std_lesson.time_start)
+                start_time = current_monday + timedelta(
+                    days=std_lesson.day_of_the_week, minutes=minute_of_day(std_lesson.time_start))
+                key = SlotKey.dated(start_time)
                 if key not in lessons_dict:
-                    start_time = current_monday + key
-
                     if start_time < on_date:
                         continue
 
@@ -1,21 +1,31 @@
+import asyncio
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import timedelta
 from itertools import chain
 
 import structlog
 from injector import inject
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload, subqueryload
+from sqlalchemy import select, Select
+from sqlalchemy.orm import selectinload
 from typing_extensions import deprecated
 
+from voice_bot.db import outbox
+from voice_bot.db.bulk import BulkWriter
 from voice_bot.db.enums import DumpStates, ScheduleRecordType, YesNo
-from voice_bot.db.models import User, StandardScheduleRecord, ScheduleRecord, UserRole
+from voice_bot.db.models import User, StandardScheduleRecord, ScheduleRecord, UserRole, SyncOutbox
+from voice_bot.db.shortcuts import is_active_record
 from voice_bot.db.update_session import UpdateSession
+from voice_bot.domain.events import SyncCompleted
 from voice_bot.domain.services.alarm_service import AlarmService
 from voice_bot.domain.services.book_lesson_service import FreeLesson, BookLessonsService
-from voice_bot.domain.services.cache_service import CacheService
 from voice_bot.domain.services.users_service import UsersService
-from voice_bot.misc.datetime_service import DatetimeService, td_days_and_str_hours
+from voice_bot.domain.sync_plan import SyncPlan, plan_sync
+from voice_bot.misc import event_bus
+from voice_bot.misc.datetime_service import DatetimeService
+from voice_bot.misc.fingerprint import fingerprint
+from voice_bot.misc.quota_scheduler import background_lane
+from voice_bot.misc.slot_key import SlotKey
+from voice_bot.misc.stopwatch import Stopwatch
 from voice_bot.spreadsheets.admins_table import AdminsTableService
 from voice_bot.spreadsheets.models.spreadsheet_admin import SpreadsheetAdmin
 from voice_bot.spreadsheets.models.spreadsheet_schedule_record import SpreadsheetScheduleRecord
@@ -26,41 +36,26 @@ from voice_bot.spreadsheets.tables_service import TablesService
 from voice_bot.spreadsheets.users_table import UsersTableService
 from voice_bot.telegram_di_scope import telegramupdate
 
-_ALL_USERS_STMT = select(User).options(subqueryload(User.roles))
-_ALL_STD_SCHEDULE_STMT = select(StandardScheduleRecord).options(joinedload(StandardScheduleRecord.user))
-_ALL_SCHEDULE_STMT = select(ScheduleRecord).options(joinedload(ScheduleRecord.user))
+# users are loaded first, selectin loads of the lessons' users then find them in the identity map
+# instead of repeating user columns on every joined lesson row
+_ALL_USERS_STMT = select(User).options(selectinload(User.roles))
+_ALL_STD_SCHEDULE_STMT = select(StandardScheduleRecord).options(selectinload(StandardScheduleRecord.user))
+_ALL_SCHEDULE_STMT = select(ScheduleRecord).options(selectinload(ScheduleRecord.user))
+_OUTBOX_IDS_STMT = select(SyncOutbox.id)
 
 
-@dataclass
-class _UserDto:
-    unique_name: str
-    is_admin: bool = False
-    fullname: str = None
-    secret_code: str = None
-    roles: list[str] = None
-    telegram_login: str = None
-    bot_record: User = None
-
-
-@dataclass
-class _ScheduleDto:
-    user_unique_name: str
-    weekday: int
-    start_time: str
-    end_time: str
-    absolute_start: datetime | None
-    is_online: bool = False
-    bot_record: ScheduleRecord = None
-    bot_std_record: StandardScheduleRecord = None
-    to_delete_in_bot: bool = False
-    to_delete_in_table: bool = False
-
-    def short_str(self):
-        return f"<{self.user_unique_name}, delete?{self.to_delete_in_table or self.to_delete_in_bot}>"
+@dataclass(frozen=True, slots=True)
+class SyncDryRun:
+    plan: SyncPlan
+    load_time: float
+    plan_time: float
 
 
 @telegramupdate
 class SpreadsheetSyncService:
+    # fingerprint of the tables left by the last sync that changed nothing, bot changes are in the outbox
+    _unchanged_state: str | None = None
+
     @inject
     def __init__(self,
                  users_table: UsersTableService,
@@ -69,19 +64,18 @@ class SpreadsheetSyncService:
                  schedule_table: ScheduleTableService,
                  params_table: ParamsTableService,
                  tables: TablesService,
-                 cache: CacheService,
                  alarm: AlarmService,
                  dt: DatetimeService,
                  bot_users_service: UsersService):
         self._dt = dt
         self._alarm = alarm
-        self._cache = cache
         self._tables = tables
         self._params = params_table
         self._schedule_table = schedule_table
         self._admins = admins_table
         self._users = users_table
         self._session = session()
+        self._bulk = BulkWriter(self._session)
         self._logger = structlog.get_logger(class_name=__class__.__name__)
         self._bot_users_service = bot_users_service
 
@@ -91,112 +85,146 @@ class SpreadsheetSyncService:
         self._bot_users: list[User] = []
         self._bot_schedule: list[ScheduleRecord] = []
         self._bot_std_schedule: list[StandardScheduleRecord] = []
-
-        self._users_merge: dict[str, _UserDto] = {}
-        self._schedule_merge: dict[str, _ScheduleDto] = {}
+        self._outbox_ids: list[int] = []
+        # unique_name -> user after the plan is applied, new users included
+        self._users_index: dict[str, User] = {}
 
         self._free_lessons: list[FreeLesson] = []
 
     async def sync_only_users(self):
-        self._table_users = await self._users.dump_records()
-        self._table_admins = await self._admins.dump_records()
-        self._bot_users = (await self._session.scalars(_ALL_USERS_STMT)).all()
-        await self._sync_users()
-        await self.rewrite_bot_std_schedule()
-        await self._session.commit()
-        await self._users.rewrite_all_records(self._table_users)
-        await self._admins.rewrite_all_records(self._table_admins)
-        self._cache.clear_claims_cache()
-
-    async def rewrite_bot_std_schedule(self):
+        with background_lane():
+            await self._sync_only_users()
+
+    async def _sync_only_users(self):
+        self._table_users, self._table_admins, std, self._bot_users = await asyncio.gather(
+            self._users.dump_records(),
+            self._admins.dump_records(),
+            self._schedule_table.get_standard_schedule(),
+            self._fetch_all(_ALL_USERS_STMT),
+        )
+        plan = plan_sync(self._table_users, self._table_admins, self._bot_users)
+        await self._apply_plan(plan)
+        await self.rewrite_bot_std_schedule(std)
+        with outbox.muted(self._session):
+            await self._bulk.apply()
+            await self._session.commit()
+        await self._write_tables(plan)
+
+    async def rewrite_bot_std_schedule(self, std: list[SpreadsheetScheduleRecord]):
+        """
+        Takes the standard sheet records read by the caller, users are looked up in the index left by _apply_plan.
+        Changes are queued in the bulk writer.
+        """
         bot = (await self._session.scalars(_ALL_STD_SCHEDULE_STMT)).all()
-        std = await self._schedule_table.get_standard_schedule()
 
-        table: dict[timedelta, SpreadsheetScheduleRecord] = \
-            {td_days_and_str_hours(rec.day_of_the_week - 1, rec.time_start): rec for rec in std}
+        table: dict[SlotKey, SpreadsheetScheduleRecord] = \
+            {SlotKey.template(rec.day_of_the_week - 1, rec.time_start, rec.time_end): rec for rec in std}
 
         for bot_rec in bot:
-            key = td_days_and_str_hours(bot_rec.day_of_the_week, bot_rec.time_start)
+            key = SlotKey.template(bot_rec.day_of_the_week, bot_rec.time_start, bot_rec.time_end)
             if key not in table:
-                await self._session.delete(bot_rec)
+                self._bulk.delete(bot_rec)
             else:
                 del table[key]
 
         for new in table.values():
-            user = await self._bot_users_service.get_user_by_unique_name(new.user_id)
-            if not user:
+            user = self._users_index.get(new.user_id)
+            if not user or not is_active_record(user):
                 await self._bot_users_service.send_text_message_to_admins(
                     f"Не удалось найти ученика {new.user_id}, проверь корректность стандартного расписания.")
                 continue
-            self._session.add(StandardScheduleRecord(
-                user=user,
+            self._bulk.insert(
+                StandardScheduleRecord,
+                user,
                 day_of_the_week=new.day_of_the_week-1,
                 time_start=new.time_start,
                 time_end=new.time_end,
                 type=ScheduleRecordType.OFFLINE,
                 dump_state=DumpStates.ACTIVE
-            ))
+            )
 
     async def perform_sync(self):
-        self._users_merge = {}
-        self._schedule_merge = {}
-
-        self._table_users = await self._users.dump_records()
-        self._table_admins = await self._admins.dump_records()
-        self._bot_users = (await self._session.scalars(_ALL_USERS_STMT)).all()
-        await self._sync_users()
-
-        await self._tables.create_tables_if_not_exist()
-        self._bot_schedule = (await self._session.scalars(_ALL_SCHEDULE_STMT)).all()
-        self._bot_std_schedule = (await self._session.scalars(_ALL_STD_SCHEDULE_STMT)).all()
-        self._table_schedule = await self._dump_schedule()
-        await self._sync_schedule()
-
-        await self._session.commit()
-        await self._users.rewrite_all_records(self._table_users)
-        await self._admins.rewrite_all_records(self._table_admins)
-        await self._schedule_table.rewrite_all_records(self._merged_schedule_to_table())
-        self._cache.clear_claims_cache()
-
-    async def _dump_schedule(self) -> list[SpreadsheetScheduleRecord]:
-        now = self._dt.now()
-        current_monday = now - timedelta(days=now.weekday())
-        return await self._schedule_table.dump_records(
-            from_monday=current_monday,
-            weeks=int(await self._params.get_param("расписание_недель_вперёд")) + 1
+        with background_lane():
+            await self._perform_sync()
+
+    async def dry_run(self) -> SyncDryRun:
+        """Plans a full sync of the current state without applying it, the tables are not created either."""
+        with background_lane():
+            stopwatch = Stopwatch()
+            self._table_users, self._table_admins, self._table_schedule, _ = await asyncio.gather(
+                self._users.dump_records(),
+                self._admins.dump_records(),
+                self._dump_schedule(),
+                self._fetch_bot_state(),
+            )
+            load_time = stopwatch.stop()
+
+            stopwatch.start()
+            plan = self._plan()
+            return SyncDryRun(plan, load_time, stopwatch.stop())
+
+    async def _perform_sync(self):
+        # sheets calls wait on the scheduler threads while the session runs the DB queries,
+        # spreadsheets not edited since the last sync are not read again
+        self._table_users, self._table_admins, self._table_schedule, _ = await asyncio.gather(
+            self._users.dump_records(),
+            self._admins.dump_records(),
+            self._create_tables_and_dump_schedule(),
+            self._fetch_bot_changes(),
         )
 
-    async def _sync_users(self):
-        for record in chain(self._table_users, self._table_admins, self._bot_users):
-            if isinstance(record, SpreadsheetUser):
-                user = _UserDto(record.unique_id)
-                user.is_admin = False
-                user.secret_code = record.secret_code
-                user.fullname = record.fullname
-                user.roles = record.roles
-                self._users_merge[record.unique_id] = user
-                continue
-
-            if isinstance(record, SpreadsheetAdmin):
-                user = _UserDto(record.unique_id)
-                user.is_admin = True
-                user.secret_code = record.secret_code
-                user.fullname = record.fullname
-                user.roles = record.roles
-                self._users_merge[record.unique_id] = user
-                continue
-
-            record: User
-            if record.unique_name in self._users_merge:
-                user = self._users_merge[record.unique_name]
-                user.bot_record = record
-                self._sync_bot_user(record, user)
-                continue
+        tables_fingerprint = self._tables_fingerprint()
+        if not self._outbox_ids and tables_fingerprint \
+                and tables_fingerprint == SpreadsheetSyncService._unchanged_state:
+            await self._logger.info("sync skipped, neither the tables nor the bot changed since the last sync")
+            return
+        SpreadsheetSyncService._unchanged_state = None
 
-            await self._session.delete(record)
+        if not self._outbox_ids:
+            await self._fetch_bot_state()
 
-        for new_user in filter(lambda u: not u.bot_record, self._users_merge.values()):
-            new_user: _UserDto
+        await self._logger.info(
+            "got table schedule",
+            table=", ".join([f"{rec.table_name}/{rec.day_of_the_week}/{rec.raw_time_start_time_end}/{rec.user_id}"
+                             for rec in self._table_schedule]))
+        plan = self._plan()
+        await self._apply_plan(plan)
+
+        # a backlog of bot-side changes can outgrow the bound parameters of a single DELETE
+        self._bulk.delete_ids(SyncOutbox, self._outbox_ids)
+        # the sync writes the sheets itself, what it takes from them is not a change to push back
+        with outbox.muted(self._session):
+            await self._bulk.apply()
+            await self._session.commit()
+        await self._write_tables(plan)
+
+        # a sync that changed nothing on either side leaves the state it read, the next one can skip it,
+        # unless a typo in the schedule is left: the admins are reminded of it on every sync
+        if not plan.changes_bot and not plan.unknown_names \
+                and tables_fingerprint and tables_fingerprint == self._tables_fingerprint():
+            SpreadsheetSyncService._unchanged_state = tables_fingerprint
+
+    def _plan(self) -> SyncPlan:
+        return plan_sync(self._table_users, self._table_admins, self._bot_users,
+                         self._table_schedule, self._bot_schedule, self._bot_std_schedule)
+
+    async def _apply_plan(self, plan: SyncPlan):
+        await self._logger.info("applying sync plan", **plan.counts())
+
+        users = {user.unique_name: user for user in self._bot_users}
+        users_by_id = {user.id: user for user in self._bot_users}
+        for removed in plan.deleted_users:
+            del users[users_by_id[removed.record_id].unique_name]
+            await self._session.delete(users_by_id[removed.record_id])
+
+        for update in plan.user_updates:
+            bot_user = users_by_id[update.user_id]
+            bot_user.fullname = update.fullname
+            bot_user.secret_code = update.secret_code
+            bot_roles = {role.role_name: role for role in bot_user.roles}
+            bot_user.roles = [bot_roles.get(role) or UserRole(user=bot_user, role_name=role) for role in update.roles]
+
+        for new_user in plan.new_users:
             user = User(
                 unique_name=new_user.unique_name,
                 fullname=new_user.fullname,
@@ -205,198 +233,81 @@ class SpreadsheetSyncService:
                 dump_state=DumpStates.ACTIVE,
             )
             user.roles = [UserRole(user=user, role_name=role) for role in new_user.roles]
-            for role in user.roles:
-                self._session.add(role)
             self._session.add(user)
-            new_user.bot_record = user
-
-        for table_user in self._table_users:
-            dto = self._users_merge[table_user.unique_id]
-            table_user.telegram_login = dto.telegram_login
-
-        for table_admin in self._table_admins:
-            dto = self._users_merge[table_admin.unique_id]
-            table_admin.telegram_login = dto.telegram_login
-
-    def _sync_bot_user(self, bot_user: User, dto: _UserDto):
-        bot_user.fullname = dto.fullname
-        bot_user.secret_code = dto.secret_code
-        dto.telegram_login = bot_user.telegram_login
-
-        bot_roles = {role.role_name: role for role in bot_user.roles}
-        new_bot_roles = []
-        for table_role in dto.roles:
-            if table_role in bot_roles:
-                new_bot_roles.append(bot_roles[table_role])
-                continue
-
-            new_role = UserRole(user=bot_user, role_name=table_role)
-            self._session.add(new_role)
-            new_bot_roles.append(new_role)
-
-        bot_user.roles = new_bot_roles
-
-    async def _sync_schedule(self):
-        await self._logger.info(
-            "got table schedule",
-            table=", ".join([f"{rec.table_name}/{rec.day_of_the_week}/{rec.raw_time_start_time_end}/{rec.user_id}"
-                             for rec in self._table_schedule]))
-
-        for table_record in self._table_schedule:
-            key = self._generate_str_schedule_key_for_table(table_record)
-            schedule = _ScheduleDto(
-                user_unique_name=table_record.user_id,
-                start_time=table_record.time_start,
-                end_time=table_record.time_end,
-                weekday=table_record.day_of_the_week - 1,
-                absolute_start=table_record.absolute_start_time,
-                is_online=table_record.is_online
+            users[new_user.unique_name] = user
+        self._users_index = users
+
+        # lesson updates are few, the unit of work batches them, inserts and deletes go through the bulk writer
+        lessons = {(type(record), record.id): record for record in chain(self._bot_schedule, self._bot_std_schedule)}
+        for update in plan.lesson_updates:
+            record = lessons[update.model, update.record_id]
+            record.dump_state = DumpStates.ACTIVE
+            if update.user_unique_name:
+                record.user = users[update.user_unique_name]
+                record.type = ScheduleRecordType.ONLINE if update.is_online else ScheduleRecordType.OFFLINE
+
+        for removed in plan.deleted_lessons:
+            self._bulk.delete(lessons[removed.model, removed.record_id])
+        if plan.deleted_lessons:
+            await self._logger.info(
+                "deleting bot schedule records", records=", ".join(ref.label for ref in plan.deleted_lessons))
+
+        for new in plan.new_lessons:
+            values = dict(
+                time_start=new.time_start,
+                time_end=new.time_end,
+                type=ScheduleRecordType.ONLINE if new.is_online else ScheduleRecordType.OFFLINE,
+                dump_state=DumpStates.ACTIVE,
             )
-            self._schedule_merge[key] = schedule
-
-        await self._logger.info(
-            "dumped table schedule",
-            vals=", ".join([f"'{k}':{v.short_str()}" for k, v in self._schedule_merge.items()]))
-
-        for record in chain(self._bot_std_schedule, self._bot_schedule):
-            key = self._generate_str_schedule_key(record)
-            existing = self._schedule_merge[key] \
-                if key in self._schedule_merge and self._schedule_merge[key].user_unique_name != '-' else None
-            if isinstance(record, ScheduleRecord):
-                record: ScheduleRecord
-                schedule = existing or _ScheduleDto(
-                    user_unique_name=record.user.unique_name,
-                    absolute_start=record.absolute_start_time,
-                    start_time=record.time_start,
-                    end_time=record.time_end,
-                    weekday=record.absolute_start_time.weekday(),
-                    is_online=record.type == ScheduleRecordType.ONLINE,
-                    to_delete_in_bot=record.dump_state != DumpStates.TO_SYNC,
-                    to_delete_in_table=record.dump_state != DumpStates.TO_SYNC,
-                )
-                if record.dump_state == DumpStates.BOT_DELETED:
-                    await self._logger.info("detected canceled lesson", lesson={
-                        "id": record.id, "user": record.user.unique_name, "datetime": record.absolute_start_time})
-                schedule.bot_record = record
+            if new.absolute_start:
+                self._bulk.insert(ScheduleRecord, users[new.user_unique_name],
+                                  absolute_start_time=new.absolute_start, **values)
             else:
-                record: StandardScheduleRecord
-                schedule = existing or _ScheduleDto(
-                    user_unique_name=record.user.unique_name,
-                    absolute_start=None,
-                    start_time=record.time_start,
-                    end_time=record.time_end,
-                    weekday=record.day_of_the_week,
-                    is_online=record.type == ScheduleRecordType.ONLINE,
-                    to_delete_in_bot=record.dump_state != DumpStates.TO_SYNC,
-                    to_delete_in_table=record.dump_state != DumpStates.TO_SYNC,
-                )
-                schedule.bot_std_record = record
-            dump_state = record.dump_state
-            if record.dump_state == DumpStates.TO_SYNC:
-                await self._logger.info("synchronized lesson", type=record.__class__, id=record.id)
-                record.dump_state = DumpStates.ACTIVE
-            self._schedule_merge[key] = schedule
-
-            if schedule.user_unique_name not in self._users_merge:
-                await self._logger.warning(
-                    "sync: cannot find user in user's table", user=schedule.user_unique_name, key=key)
-                schedule.to_delete_in_bot = True
-                schedule.to_delete_in_table = True
-                continue
-
-            if schedule.user_unique_name != record.user.unique_name:
-                if dump_state == DumpStates.TO_SYNC:
-                    schedule.user_unique_name = record.user.unique_name
-                else:
-                    record.user = self._users_merge[schedule.user_unique_name].bot_record
-                    record.dump_state = DumpStates.ACTIVE
-                    record.type = ScheduleRecordType.ONLINE if schedule.is_online else ScheduleRecordType.OFFLINE
-                continue
-
-            schedule.to_delete_in_table = schedule.to_delete_in_table or record.dump_state == DumpStates.BOT_DELETED
-            schedule.to_delete_in_bot = schedule.to_delete_in_bot or record.dump_state == DumpStates.BOT_DELETED
-
-        await self._logger.info(
-            "merging schedule", vals=", ".join([f"'{k}':{v.short_str()}" for k, v in self._schedule_merge.items()]))
-
-        for merged_record in self._schedule_merge.values():
-            if merged_record.user_unique_name == "-":
-                continue
-
-            if merged_record.to_delete_in_bot and (merged_record.bot_record or merged_record.bot_std_record):
-                to_delete = merged_record.bot_record or merged_record.bot_std_record
-                await self._logger.info("deleting bot schedule record", record_id=to_delete.id)
-                await self._session.delete(to_delete)
-                continue
+                self._bulk.insert(StandardScheduleRecord, users[new.user_unique_name],
+                                  day_of_the_week=new.weekday, **values)
+
+        for name in plan.unknown_names:
+            await self._alarm.warning("got an unexpected name in schedule tables, typo?",
+                                      src=SpreadsheetSyncService, name=name)
+            await self._bot_users_service.send_text_message_to_admins(
+                "В таблице расписания где-то есть опечатка.\n"
+                f"Не удалось найти ученика с именем '{name}'.\n"
+                "ps это сообщение будет отправляться каждый час, пока ошибка не будет исправлена (даже ночью)!")
+
+    async def _write_tables(self, plan: SyncPlan):
+        await self._users.rewrite_all_records(list(plan.users_table))
+        await self._admins.rewrite_all_records(list(plan.admins_table))
+        if plan.schedule_table is not None:
+            await self._schedule_table.rewrite_all_records(list(plan.schedule_table))
+        event_bus.publish(SyncCompleted(plan.changed_chat_ids))
+
+    def _tables_fingerprint(self) -> str | None:
+        parts = [table.content_fingerprint() for table in (self._users, self._admins, self._schedule_table)]
+        return None if None in parts else fingerprint(parts)
+
+    async def _fetch_all(self, stmt: Select) -> list:
+        return (await self._session.scalars(stmt)).all()
+
+    async def _fetch_bot_changes(self):
+        self._outbox_ids = await self._fetch_all(_OUTBOX_IDS_STMT)
+        if self._outbox_ids:
+            # the full sync is certain, the bot state is loaded along with the sheets
+            await self._fetch_bot_state()
+
+    async def _fetch_bot_state(self):
+        # a session runs one query at a time, these stay sequential
+        self._bot_users = await self._fetch_all(_ALL_USERS_STMT)
+        self._bot_schedule = await self._fetch_all(_ALL_SCHEDULE_STMT)
+        self._bot_std_schedule = await self._fetch_all(_ALL_STD_SCHEDULE_STMT)
+
+    async def _create_tables_and_dump_schedule(self) -> list[SpreadsheetScheduleRecord]:
+        await self._tables.create_tables_if_not_exist()
+        return await self._dump_schedule()
 
-            if not merged_record.bot_record and not merged_record.bot_std_record:
-                if merged_record.user_unique_name not in self._users_merge:
-                    await self._alarm.warning(
-                        "got an unexpected name in schedule tables, typo?",
-                        src=SpreadsheetSyncService,
-                        name=merged_record.user_unique_name,
-                    )
-                    await self._bot_users_service.send_text_message_to_admins(
-                        "В таблице расписания где-то есть опечатка.\n"
-                        f"Не удалось найти ученика с именем '{merged_record.user_unique_name}'.\n"
-                        "ps это сообщение будет отправляться каждый час, пока ошибка не будет исправлена (даже ночью)!")
-                    continue
-
-                if not merged_record.absolute_start:
-                    new_record = StandardScheduleRecord(
-                        user=self._users_merge[merged_record.user_unique_name].bot_record,
-                        day_of_the_week=merged_record.weekday,
-                        time_start=merged_record.start_time,
-                        time_end=merged_record.end_time,
-                        type=ScheduleRecordType.ONLINE if merged_record.is_online else ScheduleRecordType.OFFLINE,
-                        dump_state=DumpStates.ACTIVE,
-                    )
-                    merged_record.bot_std_record = new_record
-                else:
-                    new_record = ScheduleRecord(
-                        user=self._users_merge[merged_record.user_unique_name].bot_record,
-                        absolute_start_time=merged_record.absolute_start,
-                        time_start=merged_record.start_time,
-                        time_end=merged_record.end_time,
-                        type=ScheduleRecordType.ONLINE if merged_record.is_online else ScheduleRecordType.OFFLINE,
-                        dump_state=DumpStates.ACTIVE
-                    )
-                    merged_record.bot_record = new_record
-                self._session.add(new_record)
-
-    def _merged_schedule_to_table(self) -> list[SpreadsheetScheduleRecord]:
-        res: list[SpreadsheetScheduleRecord] = []
-        for merged in self._schedule_merge.values():
-            if merged.to_delete_in_table:
-                continue
-            res.append(SpreadsheetScheduleRecord(
-                table_name=None,
-                is_online=merged.is_online,
-                day_of_the_week=merged.weekday + 1,
-                time_start=merged.start_time,
-                time_end=merged.end_time,
-                to_delete=False,
-                absolute_start_time=merged.absolute_start,
-                user_id=merged.user_unique_name,
-                raw_time_start_time_end=f'{merged.start_time}-{merged.end_time}'
-            ))
-        return res
-
-    @staticmethod
-    def _generate_str_schedule_key_for_table(schedule: SpreadsheetScheduleRecord):
-        if schedule.absolute_start_time and schedule.table_name != "Стандарт":
-            return f"{schedule.absolute_start_time.isoformat()}"
-
-        return f"{schedule.day_of_the_week - 1};{schedule.time_start}-{schedule.time_end}"
-
-    @staticmethod
-    def _generate_str_schedule_key(
-            schedule: ScheduleRecord | StandardScheduleRecord
-    ) -> str:
-        if isinstance(schedule, ScheduleRecord):
-            return f"{schedule.absolute_start_time.isoformat()}"
-
-        if isinstance(schedule, StandardScheduleRecord):
-            return f"{schedule.day_of_the_week};{schedule.time_start}-{schedule.time_end}"
-
-        raise RuntimeError()
+    async def _dump_schedule(self) -> list[SpreadsheetScheduleRecord]:
+        now = self._dt.now()
+        current_monday = now - timedelta(days=now.weekday())
+        return await self._schedule_table.dump_records(
+            from_monday=current_monday,
+            weeks=int(await self._params.get_param("расписание_недель_вперёд")) + 1
+        )
@@ -4,10 +4,11 @@ from sqlalchemy import select
 from voice_bot.db.enums import YesNo
 from voice_bot.db.models import User
 from voice_bot.db.update_session import UpdateSession
+from voice_bot.domain.events import UserRegistered
 from voice_bot.domain.roles import UserRoles
-from voice_bot.domain.services.cache_service import CacheService
 from voice_bot.domain.services.reminders_service import RemindersService
 from voice_bot.domain.services.users_service import UsersService
+from voice_bot.misc import event_bus
 from voice_bot.spreadsheets.params_table import ParamsTableService
 from voice_bot.telegram_di_scope import telegramupdate
 
@@ -19,13 +20,11 @@ class UserRegistrationService:
                  params: ParamsTableService,
                  users: UsersService,
                  session: UpdateSession,
-                 cache: CacheService,
                  reminders: RemindersService):
         self._reminders = reminders
         self._session = session.session
         self._params = params
         self._users = users
-        self._cache = cache
 
     async def register_user(self, telegram_login: str, chat_id: str, secret_code: str) -> User | None:
         if not secret_code:
@@ -44,6 +43,7 @@ class UserRegistrationService:
             return None
 
         user: User = users[0]
+        previous_chat_id = user.telegram_chat_id
         user.telegram_login = telegram_login
         user.telegram_chat_id = chat_id
 
@@ -58,6 +58,6 @@ class UserRegistrationService:
         if user.is_admin == YesNo.NO:
             await self._reminders.set_reminder_state_for(user, "за сутки", True)
 
-        self._cache.clear_claims_cache()
+        event_bus.publish(UserRegistered(chat_id, previous_chat_id))
 
         return users[0]
@@ -8,6 +8,7 @@ from voice_bot.db.models import UserRole, User
 from voice_bot.db.shortcuts import is_active
 from voice_bot.db.update_session import UpdateSession
 from voice_bot.domain.services.message_builder import MessageBuilder
+from voice_bot.domain.services.principals_service import PrincipalsService
 from voice_bot.misc.user_mock import try_mock_subj_to_chat_id
 from voice_bot.telegram_bot.navigation.base_classes import NavigationTree
 from voice_bot.telegram_bot.navigation.navigation import Navigation
@@ -22,7 +23,9 @@ class UsersService:
                  msg_builder: MessageBuilder,
                  tg_bot_proxy: TelegramBotProxy,
                  session: UpdateSession,
-                 navigation: Navigation):
+                 navigation: Navigation,
+                 principals: PrincipalsService):
+        self._principals = principals
         self._navigation = navigation
         self._msg_builder = msg_builder
         self._session = session.session
@@ -47,8 +50,10 @@ class UsersService:
                                           .options(subqueryload(User.roles)))
 
     async def get_user_by_tg_id(self, chat_id: str) -> User | None:
-        return await self._session.scalar(select(User).where(is_active(User) & (User.telegram_chat_id == chat_id))
-                                          .options(subqueryload(User.roles)))
+        principal = await self._principals.get_principal(chat_id)
+        if not principal:
+            return None
+        return await self.get_user_by_id(principal.id)
 
     async def get_all_admins(self) -> list[User]:
         query = select(User).where(is_active(User) & (User.is_admin == YesNo.YES))
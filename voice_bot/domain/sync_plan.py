@@ -0,0 +1,407 @@
+from dataclasses import dataclass, replace
+from datetime import datetime
+from itertools import chain
+from typing import Iterable, Callable
+
+from voice_bot.db.enums import DumpStates, ScheduleRecordType
+from voice_bot.db.models import User, StandardScheduleRecord, ScheduleRecord
+from voice_bot.misc.slot_key import SlotKey
+from voice_bot.spreadsheets.models.spreadsheet_admin import SpreadsheetAdmin
+from voice_bot.spreadsheets.models.spreadsheet_schedule_record import SpreadsheetScheduleRecord
+from voice_bot.spreadsheets.models.spreadsheet_user import SpreadsheetUser
+
+
+@dataclass(frozen=True, slots=True)
+class NewUser:
+    unique_name: str
+    fullname: str
+    secret_code: str
+    is_admin: bool
+    roles: tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class UserUpdate:
+    user_id: int
+    unique_name: str
+    fullname: str
+    secret_code: str
+    roles: tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class NewLesson:
+    user_unique_name: str
+    weekday: int
+    time_start: str
+    time_end: str
+    is_online: bool
+    # None for a lesson of the standard schedule
+    absolute_start: datetime | None
+
+
+@dataclass(frozen=True, slots=True)
+class LessonUpdate:
+    model: type[ScheduleRecord | StandardScheduleRecord]
+    record_id: int
+    # set when the sheet gave the slot to another user, the lesson becomes active either way
+    user_unique_name: str | None = None
+    is_online: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class RecordRef:
+    model: type[User | ScheduleRecord | StandardScheduleRecord]
+    record_id: int
+    label: str
+
+
+@dataclass(frozen=True, slots=True)
+class CellChange:
+    sheet: str
+    key: str
+    old: str | None
+    new: str
+
+
+@dataclass(frozen=True, slots=True)
+class SyncPlan:
+    """
+    What a sync changes in the bot and in the sheets. Built by plan_sync without touching either,
+    SpreadsheetSyncService applies it.
+    """
+    new_users: tuple[NewUser, ...] = ()
+    user_updates: tuple[UserUpdate, ...] = ()
+    deleted_users: tuple[RecordRef, ...] = ()
+    new_lessons: tuple[NewLesson, ...] = ()
+    lesson_updates: tuple[LessonUpdate, ...] = ()
+    deleted_lessons: tuple[RecordRef, ...] = ()
+    cell_changes: tuple[CellChange, ...] = ()
+    # contents to write to the sheets
+    users_table: tuple[SpreadsheetUser, ...] = ()
+    admins_table: tuple[SpreadsheetAdmin, ...] = ()
+    # None when the sync does not touch the schedule
+    schedule_table: tuple[SpreadsheetScheduleRecord, ...] | None = None
+    # names in the schedule sheets missing from the users sheets, the admins are told about each
+    unknown_names: tuple[str, ...] = ()
+    changed_chat_ids: frozenset[str] = frozenset()
+
+    @property
+    def changes_bot(self) -> bool:
+        return any((self.new_users, self.user_updates, self.deleted_users,
+                    self.new_lessons, self.lesson_updates, self.deleted_lessons))
+
+    def counts(self) -> dict[str, int]:
+        return {
+            "new_users": len(self.new_users),
+            "user_updates": len(self.user_updates),
+            "deleted_users": len(self.deleted_users),
+            "new_lessons": len(self.new_lessons),
+            "lesson_updates": len(self.lesson_updates),
+            "deleted_lessons": len(self.deleted_lessons),
+            "cell_changes": len(self.cell_changes),
+            "admin_messages": len(self.unknown_names),
+            "changed_chats": len(self.changed_chat_ids),
+        }
+
+    @property
+    def size(self) -> int:
+        return sum(self.counts().values())
+
+    def describe(self, limit: int = 3) -> list[str]:
+        lines = [
+            f"users: +{len(self.new_users)} ~{len(self.user_updates)} -{len(self.deleted_users)}",
+            f"lessons: +{len(self.new_lessons)} ~{len(self.lesson_updates)} -{len(self.deleted_lessons)}",
+            f"sheet cells: {len(self.cell_changes)}",
+            f"admin messages: {len(self.unknown_names)}, changed chats: {len(self.changed_chat_ids)}",
+        ]
+
+        sections: list[tuple[str, tuple, Callable]] = [
+            ("+user", self.new_users, lambda user: user.unique_name),
+            ("~user", self.user_updates, lambda user: user.unique_name),
+            ("-user", self.deleted_users, lambda ref: ref.label),
+            ("+lesson", self.new_lessons, _lesson_label),
+            ("~lesson", self.lesson_updates,
+             lambda update: f"{update.record_id} -> {update.user_unique_name or 'active'}"),
+            ("-lesson", self.deleted_lessons, lambda ref: ref.label),
+            ("cell", self.cell_changes, lambda cell: f"{cell.sheet}/{cell.key}: '{cell.old or ''}' -> '{cell.new}'"),
+            ("unknown", self.unknown_names, str),
+        ]
+        for title, items, label in sections:
+            lines += [f"{title} {label(item)}" for item in items[:limit]]
+            if len(items) > limit:
+                lines.append(f"{title} ... {len(items) - limit} more")
+
+        return lines
+
+
+def _lesson_label(lesson: NewLesson) -> str:
+    start = lesson.absolute_start.isoformat() if lesson.absolute_start else f"{lesson.weekday};{lesson.time_start}"
+    return f"{lesson.user_unique_name} {start}"
+
+
+def _cell(record: SpreadsheetScheduleRecord) -> str:
+    return f"{record.user_id} (онлайн)" if record.is_online else record.user_id
+
+
+@dataclass
+class _UserDto:
+    unique_name: str
+    is_admin: bool = False
+    fullname: str = None
+    secret_code: str = None
+    roles: list[str] = None
+    telegram_login: str = None
+    bot_record: User = None
+
+
+@dataclass
+class _ScheduleDto:
+    user_unique_name: str
+    weekday: int
+    start_time: str
+    end_time: str
+    absolute_start: datetime | None
+    is_online: bool = False
+    bot_record: ScheduleRecord = None
+    bot_std_record: StandardScheduleRecord = None
+    to_delete_in_bot: bool = False
+    to_delete_in_table: bool = False
+
+
+def table_slot_key(schedule: SpreadsheetScheduleRecord) -> SlotKey:
+    if schedule.absolute_start_time and schedule.table_name != "Стандарт":
+        return SlotKey.dated(schedule.absolute_start_time)
+
+    return SlotKey.template(schedule.day_of_the_week - 1, schedule.time_start, schedule.time_end)
+
+
+def bot_slot_key(schedule: ScheduleRecord | StandardScheduleRecord) -> SlotKey:
+    if isinstance(schedule, ScheduleRecord):
+        return SlotKey.dated(schedule.absolute_start_time)
+
+    if isinstance(schedule, StandardScheduleRecord):
+        return SlotKey.template(schedule.day_of_the_week, schedule.time_start, schedule.time_end)
+
+    raise RuntimeError()
+
+
+def plan_sync(table_users: list[SpreadsheetUser],
+              table_admins: list[SpreadsheetAdmin],
+              bot_users: list[User],
+              table_schedule: list[SpreadsheetScheduleRecord] | None = None,
+              bot_schedule: Iterable[ScheduleRecord] = (),
+              bot_std_schedule: Iterable[StandardScheduleRecord] = ()) -> SyncPlan:
+    """
+    Merges the sheets with the bot, the sheets win except for lessons booked or cancelled in the bot.
+    Only reads its arguments, the schedule is left out of the plan when table_schedule is None.
+    """
+    planner = _Planner()
+    planner.plan_users(table_users, table_admins, bot_users)
+    if table_schedule is not None:
+        planner.plan_schedule(table_schedule, bot_std_schedule, bot_schedule)
+    return planner.build()
+
+
+class _Planner:
+    def __init__(self):
+        self._users_merge: dict[str, _UserDto] = {}
+        self._schedule_merge: dict[SlotKey, _ScheduleDto] = {}
+        self._new_users = list[NewUser]()
+        self._user_updates = list[UserUpdate]()
+        self._deleted_users = list[RecordRef]()
+        self._new_lessons = list[NewLesson]()
+        self._lesson_updates: dict[tuple[type, int], LessonUpdate] = {}
+        self._deleted_lessons = list[RecordRef]()
+        self._cell_changes = list[CellChange]()
+        self._users_table: tuple[SpreadsheetUser, ...] = ()
+        self._admins_table: tuple[SpreadsheetAdmin, ...] = ()
+        self._schedule_table: tuple[SpreadsheetScheduleRecord, ...] | None = None
+        self._unknown_names = list[str]()
+        self._changed_chat_ids = set[str]()
+
+    def build(self) -> SyncPlan:
+        return SyncPlan(
+            new_users=tuple(self._new_users),
+            user_updates=tuple(self._user_updates),
+            deleted_users=tuple(self._deleted_users),
+            new_lessons=tuple(self._new_lessons),
+            lesson_updates=tuple(self._lesson_updates.values()),
+            deleted_lessons=tuple(self._deleted_lessons),
+            cell_changes=tuple(self._cell_changes),
+            users_table=self._users_table,
+            admins_table=self._admins_table,
+            schedule_table=self._schedule_table,
+            unknown_names=tuple(self._unknown_names),
+            changed_chat_ids=frozenset(self._changed_chat_ids),
+        )
+
+    def plan_users(self, table_users: list[SpreadsheetUser], table_admins: list[SpreadsheetAdmin],
+                   bot_users: list[User]):
+        for record in chain(table_users, table_admins):
+            self._users_merge[record.unique_id] = _UserDto(
+                record.unique_id,
+                is_admin=isinstance(record, SpreadsheetAdmin),
+                secret_code=record.secret_code,
+                fullname=record.fullname,
+                roles=record.roles,
+            )
+
+        for record in bot_users:
+            if record.unique_name in self._users_merge:
+                user = self._users_merge[record.unique_name]
+                user.bot_record = record
+                self._plan_user_update(record, user)
+                continue
+
+            if record.telegram_chat_id:
+                self._changed_chat_ids.add(record.telegram_chat_id)
+            self._deleted_users.append(RecordRef(User, record.id, record.unique_name))
+
+        for new_user in filter(lambda u: not u.bot_record, self._users_merge.values()):
+            self._new_users.append(NewUser(
+                unique_name=new_user.unique_name,
+                fullname=new_user.fullname,
+                secret_code=new_user.secret_code,
+                is_admin=new_user.is_admin,
+                roles=tuple(new_user.roles),
+            ))
+
+        # the bot knows the logins, the sheets show them
+        self._users_table = tuple(self._with_login("Ученики", user) for user in table_users)
+        self._admins_table = tuple(self._with_login("Админы", admin) for admin in table_admins)
+
+    def _plan_user_update(self, bot_user: User, dto: _UserDto):
+        bot_roles = {role.role_name for role in bot_user.roles}
+        if bot_user.telegram_chat_id and (bot_user.fullname != dto.fullname or bot_roles != set(dto.roles)):
+            self._changed_chat_ids.add(bot_user.telegram_chat_id)
+
+        dto.telegram_login = bot_user.telegram_login
+
+        if bot_user.fullname != dto.fullname or bot_user.secret_code != dto.secret_code or bot_roles != set(dto.roles):
+            self._user_updates.append(UserUpdate(
+                user_id=bot_user.id,
+                unique_name=bot_user.unique_name,
+                fullname=dto.fullname,
+                secret_code=dto.secret_code,
+                roles=tuple(dto.roles),
+            ))
+
+    def _with_login(self, sheet: str, record: SpreadsheetUser | SpreadsheetAdmin):
+        login = self._users_merge[record.unique_id].telegram_login
+        # the sheet writers leave a None cell as it is
+        if login is not None and login != record.telegram_login:
+            self._cell_changes.append(CellChange(sheet, record.unique_id, record.telegram_login, login))
+        return replace(record, telegram_login=login)
+
+    def plan_schedule(self, table_schedule: list[SpreadsheetScheduleRecord],
+                      bot_std_schedule: Iterable[StandardScheduleRecord], bot_schedule: Iterable[ScheduleRecord]):
+        old_cells = dict[SlotKey, str]()
+        for table_record in table_schedule:
+            key = table_slot_key(table_record)
+            old_cells[key] = _cell(table_record)
+            self._schedule_merge[key] = _ScheduleDto(
+                user_unique_name=table_record.user_id,
+                start_time=table_record.time_start,
+                end_time=table_record.time_end,
+                weekday=table_record.day_of_the_week - 1,
+                absolute_start=table_record.absolute_start_time,
+                is_online=table_record.is_online
+            )
+
+        for record in chain(bot_std_schedule, bot_schedule):
+            self._merge_bot_lesson(record)
+
+        for key, merged_record in self._schedule_merge.items():
+            if merged_record.user_unique_name == "-":
+                continue
+
+            bot_record = merged_record.bot_record or merged_record.bot_std_record
+            if merged_record.to_delete_in_bot and bot_record:
+                self._lesson_updates.pop((type(bot_record), bot_record.id), None)
+                self._deleted_lessons.append(
+                    RecordRef(type(bot_record), bot_record.id, f"{bot_record.user.unique_name} {key}"))
+                continue
+
+            if bot_record:
+                continue
+
+            if merged_record.user_unique_name not in self._users_merge:
+                self._unknown_names.append(merged_record.user_unique_name)
+                continue
+
+            self._new_lessons.append(NewLesson(
+                user_unique_name=merged_record.user_unique_name,
+                weekday=merged_record.weekday,
+                time_start=merged_record.start_time,
+                time_end=merged_record.end_time,
+                is_online=merged_record.is_online,
+                absolute_start=merged_record.absolute_start,
+            ))
+
+        self._plan_schedule_table(old_cells)
+
+    def _merge_bot_lesson(self, record: ScheduleRecord | StandardScheduleRecord):
+        key = bot_slot_key(record)
+        existing = self._schedule_merge[key] \
+            if key in self._schedule_merge and self._schedule_merge[key].user_unique_name != '-' else None
+        schedule = existing or _ScheduleDto(
+            user_unique_name=record.user.unique_name,
+            absolute_start=record.absolute_start_time if isinstance(record, ScheduleRecord) else None,
+            start_time=record.time_start,
+            end_time=record.time_end,
+            weekday=record.absolute_start_time.weekday() if isinstance(record, ScheduleRecord)
+            else record.day_of_the_week,
+            is_online=record.type == ScheduleRecordType.ONLINE,
+            to_delete_in_bot=record.dump_state != DumpStates.TO_SYNC,
+            to_delete_in_table=record.dump_state != DumpStates.TO_SYNC,
+        )
+        if isinstance(record, ScheduleRecord):
+            schedule.bot_record = record
+        else:
+            schedule.bot_std_record = record
+        self._schedule_merge[key] = schedule
+
+        if record.dump_state == DumpStates.TO_SYNC:
+            self._lesson_updates[type(record), record.id] = LessonUpdate(type(record), record.id)
+
+        if schedule.user_unique_name not in self._users_merge:
+            schedule.to_delete_in_bot = True
+            schedule.to_delete_in_table = True
+            return
+
+        if schedule.user_unique_name != record.user.unique_name:
+            if record.dump_state == DumpStates.TO_SYNC:
+                schedule.user_unique_name = record.user.unique_name
+            else:
+                self._lesson_updates[type(record), record.id] = LessonUpdate(
+                    type(record), record.id, user_unique_name=schedule.user_unique_name, is_online=schedule.is_online)
+            return
+
+        schedule.to_delete_in_table = schedule.to_delete_in_table or record.dump_state == DumpStates.BOT_DELETED
+        schedule.to_delete_in_bot = schedule.to_delete_in_bot or record.dump_state == DumpStates.BOT_DELETED
+
+    def _plan_schedule_table(self, old_cells: dict[SlotKey, str]):
+        res = list[SpreadsheetScheduleRecord]()
+        for key, merged in self._schedule_merge.items():
+            if merged.to_delete_in_table:
+                continue
+            record = SpreadsheetScheduleRecord(
+                table_name=None,
+                is_online=merged.is_online,
+                day_of_the_week=merged.weekday + 1,
+                time_start=merged.start_time,
+                time_end=merged.end_time,
+                to_delete=False,
+                absolute_start_time=merged.absolute_start,
+                user_id=merged.user_unique_name,
+                raw_time_start_time_end=f'{merged.start_time}-{merged.end_time}'
+            )
+            res.append(record)
+
+            cell, old_cell = _cell(record), old_cells.pop(key, None)
+            if old_cell != cell:
+                self._cell_changes.append(CellChange("Расписание", str(key), old_cell, cell))
+
+        self._cell_changes += [CellChange("Расписание", str(key), cell, "") for key, cell in old_cells.items()]
+        self._schedule_table = tuple(res)
@@ -43,11 +43,6 @@ def day_with_str_hours(day: datetime, time: str) -> datetime:
     return to_midnight(day) + timedelta(hours=int(split[0]), minutes=int(split[1]))
 
 
-def td_days_and_str_hours(days: int, time: str) -> timedelta:
-    split = time.split(":")
-    return timedelta(days=days, hours=int(split[0]), minutes=int(split[1]))
-
-
 def str_hours_from_dt(dt: datetime) -> str:
     return f"{dt.hour:02d}:{dt.minute:02d}"
 
@@ -0,0 +1,15 @@
+from collections import defaultdict
+from typing import Callable, TypeVar
+
+E = TypeVar('E')
+
+_handlers = defaultdict[type, list[Callable[[any], None]]](list)
+
+
+def subscribe(event_type: type[E], handler: Callable[[E], None]):
+    _handlers[event_type].append(handler)
+
+
+def publish(event: any):
+    for handler in _handlers[type(event)]:
+        handler(event)
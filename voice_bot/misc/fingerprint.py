@@ -0,0 +1,6 @@
+from hashlib import blake2b
+
+
+def fingerprint(*parts: any) -> str:
+    # parts are plain values and nested lists/tuples of them, their repr is stable
+    return blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
@@ -0,0 +1,113 @@
+import asyncio
+import functools
+import itertools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from typing import Callable, TypeVar
+
+import structlog
+
+R = TypeVar('R')
+
+_MAX_BACKOFF = 32
+
+
+class Lane(Enum):
+    INTERACTIVE = "interactive"
+    BACKGROUND = "background"
+
+
+_lane = ContextVar[Lane]("quota_lane", default=Lane.INTERACTIVE)
+
+
+@contextmanager
+def background_lane():
+    """Google API calls made inside are queued as bulk work: they leave a reserve of quota and workers."""
+    token = _lane.set(Lane.BACKGROUND)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        if per_minute <= 0:
+            raise ValueError(f"Quota must be positive, got {per_minute} requests per minute")
+
+        self.capacity = per_minute
+        # background calls leave this much for interactive ones, a reserve of the whole
+        # capacity would never let them through
+        self.reserve = min(max(1, per_minute // 10), per_minute - 1)
+        self._rate = per_minute / 60
+        self._tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def take(self, reserve: int = 0) -> float:
+        """Takes a token and returns 0, or returns how long to wait before trying again."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+        if self._tokens - 1 >= reserve:
+            self._tokens -= 1
+            return 0
+
+        return (reserve + 1 - self._tokens) / self._rate
+
+
+class QuotaScheduler:
+    def __init__(self,
+                 name: str,
+                 reads: TokenBucket,
+                 writes: TokenBucket,
+                 workers: int,
+                 interactive_workers: int,
+                 timeout: float,
+                 retryable: Callable[[Exception], bool],
+                 retryable_write: Callable[[Exception], bool],
+                 retries: int = 5):
+        self._reads = reads
+        self._writes = writes
+        self._timeout = timeout
+        self._retryable = retryable
+        # a write that failed on the server may have been applied, only a rejected one is safe to repeat
+        self._retryable_write = retryable_write
+        self._retries = retries
+        # a bulk rewrite cannot occupy the threads interactive calls run on
+        self._executors = {
+            Lane.INTERACTIVE: ThreadPoolExecutor(max_workers=interactive_workers, thread_name_prefix=f"{name}-i"),
+            Lane.BACKGROUND: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-b"),
+        }
+        self._logger = structlog.get_logger(class_name=__class__.__name__, scheduler=name)
+
+    async def run(self, func: Callable[..., R], *args, write: bool = False, **kwargs) -> R:
+        # a timed out call is abandoned, its thread finishes the request in the background
+        lane = _lane.get()
+        bucket = self._writes if write else self._reads
+        retryable = self._retryable_write if write else self._retryable
+        call = functools.partial(func, *args, **kwargs)
+
+        for attempt in itertools.count():
+            await self._acquire(bucket, lane)
+            try:
+                return await asyncio.wait_for(
+                    asyncio.get_running_loop().run_in_executor(self._executors[lane], call), self._timeout)
+            except Exception as e:
+                if attempt >= self._retries or not retryable(e):
+                    raise
+
+                delay = min(_MAX_BACKOFF, 2 ** attempt) + random.random()
+                await self._logger.warning(
+                    "google api call failed, retrying", lane=lane.value, attempt=attempt, delay=delay, exception=e)
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _acquire(bucket: TokenBucket, lane: Lane):
+        reserve = 0 if lane == Lane.INTERACTIVE else bucket.reserve
+        while wait := bucket.take(reserve):
+            await asyncio.sleep(wait)
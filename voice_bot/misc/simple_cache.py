@@ -1,55 +1,354 @@
+import asyncio
 import functools
+import heapq
+import inspect
+import itertools
 import json
-from dataclasses import dataclass
-from datetime import timedelta, datetime
+import os
+import pickle
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import timedelta
 from hashlib import md5
-from typing import TypeVar
+from pathlib import Path
+from typing import TypeVar, Hashable, Callable
 
+import structlog
 
-@dataclass
+DEFAULT_MAX_SIZE = 1024
+
+_SNAPSHOT_VERSION = 2
+
+KeyBuilder = Callable[[tuple, dict], Hashable]
+
+
+def _hashed_key(values: tuple) -> str:
+    return md5(json.dumps(values, default=str).encode("utf-8")).hexdigest()
+
+
+def _key_builder_for(func: callable) -> KeyBuilder:
+    signature = inspect.signature(func)
+    parameters = list(signature.parameters.values())[1:]
+    if not parameters:
+        return lambda args, kwargs: ()
+
+    # the wrapper passes the arguments without self
+    signature = signature.replace(parameters=parameters)
+    positional = all(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) for p in parameters)
+
+    def build_key(args: tuple, kwargs: dict) -> Hashable:
+        if positional and not kwargs and len(args) == len(parameters):
+            values = args
+        else:
+            # keyword and positional calls, with the defaults filled in, get the same key
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            values = tuple(tuple(sorted(bound.arguments[p.name].items())) if p.kind is p.VAR_KEYWORD
+                           else bound.arguments[p.name] for p in parameters)
+        # 1, 1.0 and True are equal and hash the same, the types tell them apart
+        key = values + tuple(map(type, values))
+        try:
+            hash(key)
+        except TypeError:
+            return _hashed_key(key)
+        return key
+    return build_key
+
+
+@dataclass(slots=True)
 class _CacheEntry:
     value: any
-    creation_date: datetime
-    duration: timedelta
+    expires_at: float
+    refresh_at: float
+
+
+@dataclass
+class CacheStats:
+    prefix: str
+    hits: int = 0
+    misses: int = 0
+    loads: int = 0
+    coalesced: int = 0
+    expirations: int = 0
+    evictions: int = 0
+    load_time: float = 0
+    entries: int = 0
+    approx_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+
+def _approx_size(obj: any, seen: set[int], depth: int = 4) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if depth == 0:
+        return size
+
+    if isinstance(obj, dict):
+        size += sum(_approx_size(k, seen, depth - 1) + _approx_size(v, seen, depth - 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_approx_size(item, seen, depth - 1) for item in obj)
+    else:
+        if hasattr(obj, "__dict__"):
+            size += _approx_size(vars(obj), seen, depth - 1)
+        # slotted objects, the cache entries among them, keep their attributes outside of __dict__
+        size += sum(_approx_size(value, seen, depth - 1) for value in _slot_values(obj))
+    return size
+
+
+def _slot_values(obj: any) -> list:
+    values = []
+    for cls in type(obj).__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            if name not in ("__dict__", "__weakref__") and hasattr(obj, name):
+                values.append(getattr(obj, name))
+    return values
+
+
+class _Namespace:
+    def __init__(self, prefix: str, lifespan: timedelta, max_size: int, refresh_after: timedelta | None,
+                 negative_lifespan: timedelta | None, persistent: bool, build_key: KeyBuilder | None):
+        self.prefix = prefix
+        self.build_key = build_key
+        self.persistent = persistent
+        self.lifespan = lifespan.total_seconds()
+        self.refresh_after = refresh_after.total_seconds() if refresh_after else self.lifespan
+        self.negative_lifespan = negative_lifespan.total_seconds() if negative_lifespan else None
+        self.max_size = max_size
+        self.entries = OrderedDict[Hashable, _CacheEntry]()
+        self.inflight = dict[Hashable, asyncio.Task]()
+        self.stats = CacheStats(prefix)
+        self._expirations = list[tuple[float, int, Hashable]]()
+        # tiebreaker, keys of different types cannot be compared by the heap
+        self._sequence = itertools.count()
+
+    def get(self, key: Hashable, now: float) -> _CacheEntry | None:
+        self.expire(now)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, value: any, now: float):
+        if value is None and self.negative_lifespan is not None:
+            self._insert(key, _CacheEntry(value, now + self.negative_lifespan, now + self.negative_lifespan))
+            return
+        self._insert(key, _CacheEntry(value, now + self.lifespan, now + self.refresh_after))
+
+    def restore(self, key: Hashable, value: any, expires_at: float, now: float):
+        # restored values are revalidated in the background on their first hit
+        self._insert(key, _CacheEntry(value, expires_at, now))
+
+    def _insert(self, key: Hashable, entry: _CacheEntry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        heapq.heappush(self._expirations, (entry.expires_at, next(self._sequence), key))
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats.evictions += 1
+
+        if len(self._expirations) > 2 * self.max_size:
+            self._compact()
+
+    def expire(self, now: float):
+        expirations = self._expirations
+        while expirations and expirations[0][0] < now:
+            expires_at, _, key = heapq.heappop(expirations)
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                del self.entries[key]
+                self.stats.expirations += 1
+
+    def discard(self, key: Hashable):
+        self.entries.pop(key, None)
+        # a load in flight may have read the state that is being invalidated,
+        # dropping its task stops it from writing the result back
+        self.inflight.pop(key, None)
+
+    def clear(self):
+        # swapping containers keeps invalidation O(1), loads started before it
+        # are not in the new inflight and do not write their results back
+        self.entries = OrderedDict[Hashable, _CacheEntry]()
+        self.inflight = dict[Hashable, asyncio.Task]()
+        self._expirations = list[tuple[float, int, Hashable]]()
+
+    def _compact(self):
+        # heap keeps records of overwritten and evicted entries until they expire
+        self._expirations = [(entry.expires_at, next(self._sequence), key) for key, entry in self.entries.items()]
+        heapq.heapify(self._expirations)
 
 
 class SimpleCache:
     T = TypeVar('T', bound=callable)
 
     def __init__(self):
-        self._cache = dict[str, _CacheEntry]()
+        self._namespaces = dict[str, _Namespace]()
+        self._refreshes = set[asyncio.Task]()
+        self._logger = structlog.get_logger(class_name=__class__.__name__)
+
+    def cache_decorator(
+            self,
+            key_prefix: str,
+            lifespan: timedelta,
+            max_size: int = DEFAULT_MAX_SIZE,
+            refresh_after: timedelta | None = None,
+            negative_lifespan: timedelta | None = None,
+            key_builder: KeyBuilder | None = None,
+            persistent: bool = False
+    ):
+        """
+        Entries older than refresh_after are served stale while a background task reloads them.
+        None results are kept for negative_lifespan instead of lifespan when it is set.
+        """
+        namespace = self._namespaces.setdefault(key_prefix, _Namespace(
+            key_prefix, lifespan, max_size, refresh_after, negative_lifespan, persistent, key_builder))
 
-    def cache_decorator(self, key_prefix: str, lifespan: timedelta):
         def decorator(func: SimpleCache.T) -> SimpleCache.T:
+            build_key = namespace.build_key = namespace.build_key or _key_builder_for(func)
+
             @functools.wraps(func)
             async def wrapper(other_self, *args, **kwargs):
-                args_dumped = json.dumps(args, default=str) + json.dumps(kwargs, default=str)
-
-                key_hash = md5(args_dumped.encode("utf-8")).hexdigest()
-                key = f"{key_prefix}:{key_hash}"
-                if key in self._cache:
-                    val = self._cache[key]
+                key = build_key(args, kwargs)
+                now = time.monotonic()
+                entry = namespace.get(key, now)
+                if entry is not None:
+                    namespace.stats.hits += 1
+                    if entry.refresh_at <= now and key not in namespace.inflight:
+                        self._refresh_in_background(namespace, key, func, other_self, *args, **kwargs)
+                    return entry.value
 
-                    if val.creation_date + val.duration >= datetime.now():
-                        return val.value
+                namespace.stats.misses += 1
+                if key in namespace.inflight:
+                    namespace.stats.coalesced += 1
+                    return await asyncio.shield(namespace.inflight[key])
 
-                new_val = await func(other_self, *args, **kwargs)
-                self._cache[key] = _CacheEntry(new_val, datetime.now(), lifespan)
-                return new_val
+                return await asyncio.shield(self._load(namespace, key, func, other_self, *args, **kwargs))
             return wrapper
         return decorator
 
-    def delete_key(self, key: str):
-        for cache_key in self._cache:
-            if cache_key.startswith(key):
-                self._cache.pop(cache_key, None)
-                return
+    @staticmethod
+    def _load(namespace: _Namespace, key: Hashable, func: T, *args, **kwargs) -> asyncio.Task:
+        # the load is a task of its own that every caller awaits shielded, so a caller cancelled
+        # while waiting does not cancel the load for the callers coalesced on it
+        namespace.stats.loads += 1
+
+        async def load():
+            started = time.perf_counter()
+            try:
+                new_val = await func(*args, **kwargs)
+            finally:
+                namespace.stats.load_time += time.perf_counter() - started
+                # a discard or clear drops the task, a load started after it must keep its own
+                # registration and this one must not write back what it read before it
+                registered = namespace.inflight.get(key) is asyncio.current_task()
+                if registered:
+                    del namespace.inflight[key]
+
+            if registered:
+                namespace.put(key, new_val, time.monotonic())
+            return new_val
+
+        task = asyncio.create_task(load())
+        namespace.inflight[key] = task
+        # the callers may all be gone, the failure must not be logged as unretrieved then
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return task
+
+    def _refresh_in_background(self, namespace: _Namespace, key: Hashable, func: T, *args, **kwargs):
+        async def refresh(load: asyncio.Task):
+            try:
+                await load
+            except Exception as e:
+                await self._logger.warning("background cache refresh failed", prefix=namespace.prefix, exception=e)
+
+        task = asyncio.create_task(refresh(self._load(namespace, key, func, *args, **kwargs)))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    def delete_key(self, key_prefix: str):
+        if key_prefix in self._namespaces:
+            self._namespaces[key_prefix].clear()
+
+    def delete_entry(self, key_prefix: str, *args, **kwargs):
+        namespace = self._namespaces.get(key_prefix)
+        if namespace and namespace.build_key:
+            namespace.discard(namespace.build_key(args, kwargs))
+
+    def save_snapshot(self, path: Path):
+        now, wall_now = time.monotonic(), time.time()
+        namespaces = dict[str, list[tuple[Hashable, any, float]]]()
+        for namespace in filter(lambda n: n.persistent, self._namespaces.values()):
+            namespace.expire(now)
+            namespaces[namespace.prefix] = [
+                (key, entry.value, wall_now + entry.expires_at - now) for key, entry in namespace.entries.items()
+            ]
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as file:
+            pickle.dump({"version": _SNAPSHOT_VERSION, "namespaces": namespaces}, file)
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path: Path) -> int:
+        with open(path, "rb") as file:
+            snapshot = pickle.load(file)
+
+        if snapshot.get("version") != _SNAPSHOT_VERSION:
+            return 0
+
+        now, wall_now = time.monotonic(), time.time()
+        restored = 0
+        for prefix, entries in snapshot["namespaces"].items():
+            namespace = self._namespaces.get(prefix)
+            if not namespace or not namespace.persistent:
+                continue
+
+            for key, value, expires_at in entries:
+                if expires_at <= wall_now:
+                    continue
+                namespace.restore(key, value, now + expires_at - wall_now, now)
+                restored += 1
+
+        return restored
+
+    def stats(self) -> list[CacheStats]:
+        now = time.monotonic()
+        res = list[CacheStats]()
+        for namespace in self._namespaces.values():
+            namespace.expire(now)
+            res.append(replace(
+                namespace.stats,
+                entries=len(namespace.entries),
+                # one level more for the entry wrapping each value
+                approx_bytes=_approx_size(namespace.entries, set(), depth=5),
+            ))
+        return res
+
+    def sweep(self):
+        now = time.monotonic()
+        for namespace in self._namespaces.values():
+            namespace.expire(now)
 
     def clear(self):
-        self._cache.clear()
+        for namespace in self._namespaces.values():
+            namespace.clear()
 
 
 _c = SimpleCache()
 delete_key = _c.delete_key
+delete_entry = _c.delete_entry
 clear_cache = _c.clear
+sweep_cache = _c.sweep
+cache_stats = _c.stats
+save_snapshot = _c.save_snapshot
+load_snapshot = _c.load_snapshot
 simplecache = _c.cache_decorator
@@ -0,0 +1,48 @@
+from datetime import datetime
+from functools import cache
+
+_DAY_MINUTES = 24 * 60
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+@cache
+def minute_of_day(time: str) -> int:
+    """'HH:MM' to minutes since midnight, the sheets only have a few distinct times so each is parsed once."""
+    hours, minutes = time.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+class SlotKey(int):
+    """
+    Integer key of a lesson slot: the minute since epoch for dated lessons and
+    (weekday, minute of day, end minute) for template ones. The lowest bit tells them apart.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def dated(cls, start: datetime) -> "SlotKey":
+        minute = (start.toordinal() - _EPOCH_ORDINAL) * _DAY_MINUTES + start.hour * 60 + start.minute
+        return cls(minute << 1)
+
+    @staticmethod
+    @cache
+    def template(weekday: int, time_start: str, time_end: str) -> "SlotKey":
+        # a week has a handful of distinct template slots, each is built once
+        packed = (weekday * _DAY_MINUTES + minute_of_day(time_start)) * _DAY_MINUTES + minute_of_day(time_end)
+        return SlotKey(packed << 1 | 1)
+
+    @property
+    def is_dated(self) -> bool:
+        return not self & 1
+
+    def __str__(self) -> str:
+        if self.is_dated:
+            days, minute = divmod(self >> 1, _DAY_MINUTES)
+            start = datetime.fromordinal(days + _EPOCH_ORDINAL)
+            return f"{start:%Y-%m-%d}T{minute // 60:02d}:{minute % 60:02d}"
+
+        rest, end = divmod(self >> 1, _DAY_MINUTES)
+        weekday, start = divmod(rest, _DAY_MINUTES)
+        return f"{weekday};{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+    __repr__ = __str__
@@ -12,3 +12,9 @@ class _DumpedTable(Generic[_Model]):
     @abstractmethod
     async def rewrite_all_records(self, records: list[_Model]):
         pass
+
+    def content_fingerprint(self) -> str | None:
+        """
+        Fingerprint of the values read by the last dump_records, None when unknown or written since then.
+        """
+        return None
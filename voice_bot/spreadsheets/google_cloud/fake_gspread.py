@@ -0,0 +1,181 @@
+import json
+import random
+import threading
+import time
+
+from gspread import Worksheet
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+from injector import singleton
+
+from voice_bot.spreadsheets.google_cloud.gspread import GspreadClient
+from voice_bot.voice_bot_configurator import VoiceBotConfigurator
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.text = f"injected error {status_code}"
+
+    def json(self) -> dict:
+        return {"error": {"code": self.status_code, "message": self.text}}
+
+
+class FakeSpreadsheet:
+    """
+    In-memory stand-in for gspread.Spreadsheet, implements the values, metadata and
+    revision calls gspread.Worksheet and GspreadClient make.
+    """
+    def __init__(self, spreadsheet_id: str, grids: dict[str, list[list[str]]],
+                 latency: float = 0, error_rate: float = 0, error_status: int = 429):
+        self.id = spreadsheet_id
+        self.title = spreadsheet_id
+        self.client = None
+        self.calls = 0
+        self._latency = latency
+        self._error_rate = error_rate
+        self._error_status = error_status
+        self._lock = threading.Lock()
+        self._sheets: list[dict] = []
+        self._grids: dict[str, list[list[str]]] = {}
+        self._revision = 0
+        for title, grid in grids.items():
+            self._add_sheet(title, [list(map(str, row)) for row in grid])
+
+    def fetch_sheet_metadata(self, params: dict | None = None) -> dict:
+        self._request()
+        with self._lock:
+            return {"sheets": [{"properties": json.loads(json.dumps(sheet))} for sheet in self._sheets]}
+
+    def values_get(self, range_name: str, params: dict | None = None) -> dict:
+        self._request()
+        with self._lock:
+            return self._read(range_name, (params or {}).get("majorDimension") == "COLUMNS")
+
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> dict:
+        self._request()
+        with self._lock:
+            return {"valueRanges": [self._read(range_name, False) for range_name in ranges]}
+
+    def values_update(self, range_name: str, params: dict | None = None, body: dict | None = None) -> dict:
+        self._request()
+        with self._lock:
+            self._write(range_name, body["values"])
+        return {"updatedRange": range_name}
+
+    def values_batch_update(self, body: dict) -> dict:
+        self._request()
+        with self._lock:
+            for value_range in body["data"]:
+                self._write(value_range["range"], value_range["values"])
+        return {"totalUpdatedRanges": len(body["data"])}
+
+    def duplicate_sheet(self, source_sheet_id: int, insert_sheet_index: int | None = None,
+                        new_sheet_id: int | None = None, new_sheet_name: str | None = None):
+        self._request()
+        with self._lock:
+            source = next(sheet for sheet in self._sheets if sheet["sheetId"] == source_sheet_id)
+            properties = self._add_sheet(
+                new_sheet_name, [list(row) for row in self._grids[source["title"]]], insert_sheet_index)
+        return Worksheet(self, dict(properties))
+
+    def get_lastUpdateTime(self) -> str:
+        self._request()
+        with self._lock:
+            return str(self._revision)
+
+    def grid(self, title: str) -> list[list[str]]:
+        return self._grids[title]
+
+    def set_value(self, title: str, row: int, col: int, value: str):
+        """An edit made by hand, 1-based like the A1 notation."""
+        with self._lock:
+            self._write(f"{title}!{rowcol_to_a1(row, col)}", [[value]])
+
+    def _request(self):
+        with self._lock:
+            self.calls += 1
+        if self._latency:
+            time.sleep(self._latency)
+        if self._error_rate and random.random() < self._error_rate:
+            raise APIError(_FakeResponse(self._error_status))
+
+    def _add_sheet(self, title: str, grid: list[list[str]], index: int | None = None) -> dict:
+        index = len(self._sheets) if index is None else index
+        for sheet in self._sheets:
+            if sheet["index"] >= index:
+                sheet["index"] += 1
+
+        properties = {
+            "sheetId": max((sheet["sheetId"] for sheet in self._sheets), default=0) + 1,
+            "title": title,
+            "index": index,
+            "gridProperties": {"rowCount": 1000, "columnCount": 26},
+        }
+        self._sheets.insert(index, properties)
+        self._grids[title] = grid
+        self._revision += 1
+        return properties
+
+    def _parse_range(self, range_name: str) -> (list[list[str]], dict):
+        title, _, a1 = range_name.rpartition("!") if "!" in range_name else (range_name, "", "")
+        title = title[1:-1].replace("''", "'") if title.startswith("'") else title
+        return self._grids[title], a1_range_to_grid_range(a1) if a1 else {}
+
+    def _read(self, range_name: str, by_columns: bool) -> dict:
+        grid, bounds = self._parse_range(range_name)
+        rows = grid[bounds.get("startRowIndex", 0):bounds.get("endRowIndex", len(grid))]
+        rows = [row[bounds.get("startColumnIndex", 0):bounds.get("endColumnIndex", len(row))] for row in rows]
+        if by_columns:
+            width = max(map(len, rows), default=0)
+            rows = [[row[i] if i < len(row) else "" for row in rows] for i in range(width)]
+
+        # the API omits trailing empty cells and rows
+        values = list[list[str]]()
+        for row in rows:
+            row = list(row)
+            while row and not row[-1]:
+                row.pop()
+            values.append(row)
+        while values and not values[-1]:
+            values.pop()
+
+        res = {"range": range_name, "majorDimension": "COLUMNS" if by_columns else "ROWS"}
+        if values:
+            res["values"] = values
+        return res
+
+    def _write(self, range_name: str, values: list[list[str]]):
+        self._revision += 1
+        grid, bounds = self._parse_range(range_name)
+        first_row, first_col = bounds.get("startRowIndex", 0), bounds.get("startColumnIndex", 0)
+        for i, row in enumerate(values):
+            while len(grid) <= first_row + i:
+                grid.append([])
+            grid_row = grid[first_row + i]
+            for j, val in enumerate(row):
+                while len(grid_row) <= first_col + j:
+                    grid_row.append("")
+                # the api skips null values
+                if val is not None:
+                    grid_row[first_col + j] = str(val)
+
+
+@singleton
+class FakeGspreadClient(GspreadClient):
+    """
+    GspreadClient over in-memory spreadsheets loaded from a json file
+    {"settings": {title: rows}, "schedule": {title: rows}}, no credentials are needed.
+    """
+    def _open_spreadsheets(self, conf: VoiceBotConfigurator) -> (FakeSpreadsheet, FakeSpreadsheet):
+        fake = conf.google_fake
+        with open(fake["data_path"], "r") as file:
+            data = json.load(file)
+
+        faults = dict(
+            latency=fake.get("latency_ms", 0) / 1000,
+            error_rate=fake.get("quota_error_rate", 0),
+            error_status=fake.get("error_status", 429),
+        )
+        return FakeSpreadsheet("settings", data["settings"], **faults), \
+            FakeSpreadsheet("schedule", data["schedule"], **faults)
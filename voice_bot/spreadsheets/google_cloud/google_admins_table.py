@@ -1,8 +1,10 @@
 from injector import singleton, inject
 
 from voice_bot.domain.roles import BotRoles
+from voice_bot.misc.fingerprint import fingerprint
 from voice_bot.spreadsheets.admins_table import AdminsTableService
 from voice_bot.spreadsheets.google_cloud.gspread import GspreadClient
+from voice_bot.spreadsheets.google_cloud.row_patches import row_patches, full_rewrite
 from voice_bot.spreadsheets.models.spreadsheet_admin import SpreadsheetAdmin
 
 
@@ -41,10 +43,7 @@ class GoogleAdminsTableService(AdminsTableService):
 
         return res
 
-    async def _fetch(self) -> (dict[str, int], list[SpreadsheetAdmin]):
-        worksheet = await self._gspread.get_settings_worksheet("Админы")
-        values = worksheet.get_values()
-
+    def _parse(self, values: list[list[str]]) -> (dict[str, int], list[SpreadsheetAdmin]):
         res = []
 
         layout = self._parse_layout(values[:2])
@@ -72,9 +71,29 @@ class GoogleAdminsTableService(AdminsTableService):
 
     _last_layout: dict[str, int] = {}
 
+    _last_rows: list[list[str]] | None = None
+
+    _last_fingerprint: str | None = None
+
+    _last_values: list[list[str]] | None = None
+
+    _last_revision: str | None = None
+
+    def content_fingerprint(self) -> str | None:
+        return self._last_fingerprint
+
     async def dump_records(self, **kwargs) -> list[SpreadsheetAdmin]:
-        layout, records = await self._fetch()
+        # the sheet is read again only if the spreadsheet was edited since the last read
+        revision = await self._gspread.revision(self._gspread.gs_settings_sheet)
+        if self._last_values is None or revision != self._last_revision:
+            self._last_values = await self._gspread.get_values(await self._gspread.get_settings_worksheet("Админы"))
+            self._last_revision = revision
+
+        values = self._last_values
+        layout, records = self._parse(values)
         self._last_layout = layout
+        self._last_rows = values[2:]
+        self._last_fingerprint = fingerprint(values)
         return records
 
     def _to_table_row(self, admin: SpreadsheetAdmin) -> list[str]:
@@ -95,17 +114,15 @@ class GoogleAdminsTableService(AdminsTableService):
 
         rows = [self._to_table_row(admin) for admin in filter(lambda x: not x.to_delete, records)]
 
-        worksheet = await self._gspread.get_settings_worksheet("Админы")
+        old_rows, self._last_rows = self._last_rows, None
+        update = full_rewrite(rows, 3) if old_rows is None \
+            else row_patches(old_rows, rows, 3, self._last_layout["unique_id"])
+        if not update:
+            return
 
-        worksheet.batch_update(
-            [{
-                'range': f'A3:Z{len(rows) + 2}',
-                'values': rows,
-            }, {
-                'range': f'A{len(rows) + 3}:Z1000',
-                'values': (1000 - len(rows) - 2) * [26 * ['']]
-            }]
-        )
+        self._last_fingerprint = self._last_revision = None
+        worksheet = await self._gspread.get_settings_worksheet("Админы")
+        await self._gspread.batch_update(worksheet, update)
 
     @staticmethod
     def delete_cache():
@@ -2,7 +2,8 @@ from datetime import timedelta
 
 from injector import inject
 
-from voice_bot.misc import simple_cache
+from voice_bot.domain.events import ParamRewritten
+from voice_bot.misc import simple_cache, event_bus
 from voice_bot.misc.simple_cache import simplecache
 from voice_bot.spreadsheets.google_cloud.gspread import GspreadClient
 from voice_bot.spreadsheets.params_table import ParamsTableService
@@ -22,13 +23,23 @@ class GoogleParamsTableService(ParamsTableService):
         simple_cache.delete_key(GoogleParamsTableService._SETTINGS_TABLE_CACHE_KEY)
         simple_cache.delete_key(GoogleParamsTableService._TEMPLATES_TABLE_CACHE_KEY)
 
-    @simplecache(_TEMPLATES_TABLE_CACHE_KEY, timedelta(days=365))
-    async def _get_templates(self) -> dict[str, str]:
+    @staticmethod
+    def subscribe_events():
+        # templates are not affected by settings rewrites
+        event_bus.subscribe(
+            ParamRewritten, lambda e: simple_cache.delete_key(GoogleParamsTableService._SETTINGS_TABLE_CACHE_KEY))
+
+    # the loaders get the singleton client rather than the service, a background refresh
+    # outlives the update that scheduled it
+    @staticmethod
+    @simplecache(_TEMPLATES_TABLE_CACHE_KEY, timedelta(days=365), refresh_after=timedelta(minutes=15),
+                 persistent=True)
+    async def _get_templates(gspread: GspreadClient) -> dict[str, str]:
         templates = dict[str, str]()
 
-        worksheet = await self._gspread.get_settings_worksheet("Шаблоны сообщений")
+        worksheet = await gspread.get_settings_worksheet("Шаблоны сообщений")
 
-        cells = worksheet.get_values()
+        cells = await gspread.get_values(worksheet)
         for row in cells[1:]:
             if not row[0]:
                 continue
@@ -37,13 +48,15 @@ class GoogleParamsTableService(ParamsTableService):
 
         return templates
 
-    @simplecache(_SETTINGS_TABLE_CACHE_KEY, timedelta(days=365))
-    async def _get_params(self) -> dict[str, str]:
+    @staticmethod
+    @simplecache(_SETTINGS_TABLE_CACHE_KEY, timedelta(days=365), refresh_after=timedelta(minutes=15),
+                 persistent=True)
+    async def _get_params(gspread: GspreadClient) -> dict[str, str]:
         params = dict[str, str]()
 
-        worksheet = await self._gspread.get_settings_worksheet("Настройки")
+        worksheet = await gspread.get_settings_worksheet("Настройки")
 
-        cells = worksheet.get_values()
+        cells = await gspread.get_values(worksheet)
 
         for row in cells[1:]:
             if not row[0]:
@@ -54,17 +67,17 @@ class GoogleParamsTableService(ParamsTableService):
         return params
 
     async def map_template(self, key: str, **kwargs) -> str:
-        templates = await self._get_templates()
+        templates = await self._get_templates(self._gspread)
 
         if key not in templates:
             return key
 
-        params = await self._get_params()
+        params = await self._get_params(self._gspread)
 
         return templates[key].format(**kwargs, **params)
 
     async def get_param(self, key: str) -> str:
-        params = await self._get_params()
+        params = await self._get_params(self._gspread)
 
         if key not in params:
             raise KeyError(f"Parameter '{key}' is not found")
@@ -74,7 +87,7 @@ class GoogleParamsTableService(ParamsTableService):
     async def rewrite_param(self, key: str, val: str):
         worksheet = await self._gspread.get_settings_worksheet("Настройки")
 
-        cells = worksheet.get_values()
+        cells = await self._gspread.get_values(worksheet)
         row_id = 0
 
         for i, row in enumerate(cells[1:]):
@@ -84,7 +97,7 @@ class GoogleParamsTableService(ParamsTableService):
         if row_id == 0:
             raise KeyError(f"Parameter '{key}' is not found")
 
-        worksheet.update(f'A{row_id}:B{row_id}', [[key, val]])
+        await self._gspread.update(worksheet, f'A{row_id}:B{row_id}', [[key, val]])
 
-        simple_cache.delete_key(self._SETTINGS_TABLE_CACHE_KEY)
+        event_bus.publish(ParamRewritten(key))
 
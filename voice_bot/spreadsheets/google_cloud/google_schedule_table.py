@@ -1,24 +1,46 @@
 import math
 from datetime import timedelta, date, datetime
-from typing import Iterable
+from itertools import chain
+from operator import attrgetter
+from typing import Iterable, Iterator
 
-from injector import inject
+from gspread.utils import absolute_range_name, rowcol_to_a1
+from injector import singleton, inject
 
+from voice_bot.domain.events import ScheduleChanged
+from voice_bot.misc import simple_cache, event_bus
+from voice_bot.misc.fingerprint import fingerprint
 from voice_bot.misc.simple_cache import simplecache
+from voice_bot.misc.slot_key import SlotKey
 from voice_bot.spreadsheets.google_cloud.gspread import GspreadClient
 from voice_bot.spreadsheets.models.spreadsheet_schedule_record import SpreadsheetScheduleRecord
 from voice_bot.spreadsheets.schedule_table import ScheduleTableService
 
+_DAY_OF_THE_WEEK = attrgetter("day_of_the_week")
 
+
+@singleton
 class GoogleScheduleTableService(ScheduleTableService):
     @inject
     def __init__(self, gspread: GspreadClient):
         self._gspread = gspread
+        self._last_dump: dict[str, list[list[str]]] = {}
+        self._last_fingerprint: str | None = None
+        # spreadsheet revision, sheet names and the values read at it
+        self._last_read: tuple[str, list[str], list[list[list[str]]]] | None = None
+
+    _SCHEDULE_CACHE_KEY = "google_schedule"
+
+    @staticmethod
+    def subscribe_events():
+        # the namespace holds a handful of sheets, dropping it is cheaper than matching keys
+        event_bus.subscribe(
+            ScheduleChanged, lambda e: simple_cache.delete_key(GoogleScheduleTableService._SCHEDULE_CACHE_KEY))
 
     async def get_standard_schedule(self) -> list[SpreadsheetScheduleRecord]:
         return await self._get_schedule_from_table_nocache(self.STANDARD_SCHEDULE_TABLE_NAME, get_dict=False)
 
-    @simplecache("google_schedule", timedelta(minutes=60))
+    @simplecache(_SCHEDULE_CACHE_KEY, timedelta(minutes=60))
     async def _get_schedule_from_table(
         self,
         table_name: str,
@@ -31,59 +53,70 @@ class GoogleScheduleTableService(ScheduleTableService):
             monday: datetime | None = None, get_dict: bool = True
     ) -> dict[str, list[SpreadsheetScheduleRecord]] | list[SpreadsheetScheduleRecord]:
         worksheet = await self._gspread.get_schedule_worksheet(table_name)
-        values = worksheet.get_values()
-
-        if monday:
-            monday = monday - timedelta(days=monday.weekday())
+        values = await self._gspread.get_values(worksheet)
+        return self._parse_schedule_values(values, table_name, monday, get_dict)
 
-        res: dict[str, list[SpreadsheetScheduleRecord]] | list[SpreadsheetScheduleRecord]
-        if get_dict:
-            res = {}
-        else:
-            res = list[SpreadsheetScheduleRecord]()
+    def _parse_schedule_values(
+            self, values: list[list[str]], table_name: str,
+            monday: datetime | None = None, get_dict: bool = True
+    ) -> dict[str, list[SpreadsheetScheduleRecord]] | list[SpreadsheetScheduleRecord]:
+        if not get_dict:
+            return list(self._iter_schedule_records(values, table_name, monday))
+
+        res: dict[str, list[SpreadsheetScheduleRecord]] = {}
+        for record in self._iter_schedule_records(values, table_name, monday):
+            records = res.get(record.user_id)
+            if records is None:
+                res[record.user_id] = [record]
+            else:
+                records.append(record)
+
+        # a user has a few records a week, sorting them is cheaper than walking the grid by columns
+        for records in res.values():
+            if len(records) > 1:
+                records.sort(key=_DAY_OF_THE_WEEK)
+        return res
 
-        for row in values[2:]:
+    @staticmethod
+    def _iter_schedule_records(
+            values: list[list[str]], table_name: str,
+            monday: datetime | None = None
+    ) -> Iterator[SpreadsheetScheduleRecord]:
+        # the time column and the dates of the week are parsed once per sheet, not once per cell
+        rows = [row for row in values[2:] if len(row) > 1]
+        slots = list[tuple[str, str, str, timedelta]]()
+        for row in rows:
             times = row[0].split("-")
-            start_time, end_time = times[0], times[1]
+            start_hours, start_minutes = map(int, times[0].split(":")) if monday else (0, 0)
+            slots.append((row[0], times[0], times[1], timedelta(hours=start_hours, minutes=start_minutes)))
 
+        days = max(map(len, rows), default=1) - 1
+        day_starts: list[datetime | None] = days * [None]
+        if monday:
+            monday = monday - timedelta(days=monday.weekday())
+            monday = datetime(year=monday.year, month=monday.month, day=monday.day)
+            day_starts = [monday + timedelta(days=day) for day in range(days)]
+
+        for (raw_time, time_start, time_end, start_offset), row in zip(slots, rows):
             for day, lesson in enumerate(row[1:]):
                 if not lesson:
                     continue
 
-                lesson_split = lesson.split()
-                schedule_record = SpreadsheetScheduleRecord(
+                user_id, *online = lesson.split(maxsplit=1)
+                day_start = day_starts[day]
+                yield SpreadsheetScheduleRecord(
                     table_name=table_name,
-                    user_id=lesson_split[0],
-                    raw_time_start_time_end=row[0],
-                    time_start=start_time,
-                    time_end=end_time,
+                    user_id=user_id,
+                    raw_time_start_time_end=raw_time,
+                    time_start=time_start,
+                    time_end=time_end,
                     day_of_the_week=day + 1,
-                    absolute_start_time=(
-                        self._get_start_datetime(start_time, monday + timedelta(days=day))
-                        if monday else None
-                    ),
-                    is_online=len(lesson_split) > 1,
+                    absolute_start_time=day_start + start_offset if day_start else None,
+                    is_online=bool(online),
                 )
 
-                if get_dict:
-                    if schedule_record.user_id not in res:
-                        res[schedule_record.user_id] = list[SpreadsheetScheduleRecord]()
-
-                    res[schedule_record.user_id].append(schedule_record)
-                    continue
-
-                res.append(schedule_record)
-
-        if get_dict:
-            for key in res:
-                res[key].sort(key=lambda x: x.day_of_the_week)
-
-        return res
-
-    @staticmethod
-    def _get_start_datetime(time_start: str, day: datetime) -> datetime:
-        start_hours, start_minutes = list(map(int, time_start.split(':')))
-        return datetime(year=day.year, month=day.month, day=day.day, hour=start_hours, minute=start_minutes)
+    def content_fingerprint(self) -> str | None:
+        return self._last_fingerprint
 
     async def get_schedule_for_timespan(
         self,
@@ -99,11 +132,16 @@ class GoogleScheduleTableService(ScheduleTableService):
         if new_sheet_title in all_sheets:
             raise RuntimeError(f"Sheet with name {new_sheet_title} already exist")
 
-        self._gspread.gs_schedule_sheet.worksheet(self.STANDARD_SCHEDULE_TABLE_NAME).duplicate(
+        self._last_fingerprint = self._last_read = None
+
+        await self._gspread.duplicate(
+            await self._gspread.get_schedule_worksheet(self.STANDARD_SCHEDULE_TABLE_NAME),
             insert_sheet_index=1,
             new_sheet_name=new_sheet_title
         )
 
+        event_bus.publish(ScheduleChanged(frozenset([new_sheet_title])))
+
     async def _get_all_schedule_sheet_names(self, from_monday: date | None = None, weeks: int = -1) -> set[str]:
         res = set[str]()
 
@@ -114,16 +152,16 @@ class GoogleScheduleTableService(ScheduleTableService):
                 name_filter.add(self.generate_table_name(from_monday))
                 from_monday += timedelta(days=7)
 
-        for worksheet in self._gspread.gs_schedule_sheet.worksheets():
-            if worksheet.title.lower() == self.STANDARD_SCHEDULE_TABLE_NAME.lower():
+        for title in await self._gspread.sheet_properties(self._gspread.gs_schedule_sheet):
+            if title.lower() == self.STANDARD_SCHEDULE_TABLE_NAME.lower():
                 continue
 
             if name_filter:
-                if worksheet.title in name_filter:
-                    res.add(worksheet.title)
+                if title in name_filter:
+                    res.add(title)
                 continue
 
-            res.add(worksheet.title)
+            res.add(title)
 
         return res
 
@@ -150,26 +188,59 @@ class GoogleScheduleTableService(ScheduleTableService):
         from_monday: datetime = kwargs['from_monday']
         weeks: int = kwargs['weeks']
 
-        res:  list[SpreadsheetScheduleRecord] = await self._get_schedule_from_table_nocache(
-            self.STANDARD_SCHEDULE_TABLE_NAME, get_dict=False
-        )
+        # sheets may have been added or renamed by hand since the last read
+        revision = await self._gspread.revision(self._gspread.gs_schedule_sheet)
+        unchanged = self._last_read is not None and self._last_read[0] == revision
+        if not unchanged:
+            await self._gspread.sheet_properties(self._gspread.gs_schedule_sheet, refresh=True)
+
+        week_sheets = list[tuple[str, datetime]]()
+        if weeks > 0:
+            sheets: dict[datetime, str] = {}
+            for sheet_name in await self._get_all_schedule_sheet_names(from_monday=from_monday, weeks=weeks):
+                day, month = sheet_name.split('-')[0].split('.')
+                sheets[datetime(year=2023, month=int(month), day=int(day))] = sheet_name
+
+            for i in range(weeks):
+                current_monday = from_monday + timedelta(days=7 * i)
+                week_sheets.append((sheets[datetime(year=2023, month=current_monday.month, day=current_monday.day)],
+                                    current_monday))
+
+        sheet_names = [self.STANDARD_SCHEDULE_TABLE_NAME] + [sheet_name for sheet_name, _ in week_sheets]
+        if unchanged and self._last_read[1] == sheet_names:
+            values = self._last_read[2]
+        else:
+            # one request for the standard sheet and every week instead of a get_values per sheet
+            values = await self._gspread.batch_get_values(self._gspread.gs_schedule_sheet, sheet_names)
+            self._last_read = revision, sheet_names, values
 
-        sheets: dict[datetime, str] = {}
-        for sheet_name in await self._get_all_schedule_sheet_names(from_monday=from_monday, weeks=weeks):
-            day, month = sheet_name.split('-')[0].split('.')
-            sheets[datetime(year=2023, month=int(month), day=int(day))] = sheet_name
+        res = list(chain(
+            self._iter_schedule_records(values[0], self.STANDARD_SCHEDULE_TABLE_NAME),
+            *(self._iter_schedule_records(sheet_values, sheet_name, monday)
+              for (sheet_name, monday), sheet_values in zip(week_sheets, values[1:]))
+        ))
 
-        for i in range(weeks):
-            current_monday = from_monday + timedelta(days=7 * i)
-            sheet_name = sheets[datetime(year=2023, month=current_monday.month, day=current_monday.day)]
-            res += await self._get_schedule_from_table_nocache(sheet_name, get_dict=False, monday=current_monday)
+        self._last_dump = dict(zip(sheet_names, values))
+        self._last_fingerprint = fingerprint(week_sheets, values)
 
         return res
 
     async def rewrite_all_records(self, records: list[SpreadsheetScheduleRecord]):
-        first_column = (await self._gspread.get_schedule_worksheet(self.STANDARD_SCHEDULE_TABLE_NAME)).col_values(1)[2:]
+        # the grids read by the last dump_records are compared with the new ones, only changed cells are sent
+        snapshot, self._last_dump = self._last_dump, {}
+        updates: dict[str, list[dict]] = {}
+
+        if self.STANDARD_SCHEDULE_TABLE_NAME in snapshot:
+            first_column = [row[0] for row in snapshot[self.STANDARD_SCHEDULE_TABLE_NAME]]
+            while first_column and not first_column[-1]:
+                first_column.pop()
+            first_column = first_column[2:]
+        else:
+            standard = await self._gspread.get_schedule_worksheet(self.STANDARD_SCHEDULE_TABLE_NAME)
+            first_column = (await self._gspread.col_values(standard, 1))[2:]
 
-        await self._rewrite_schedule_table(
+        updates[self.STANDARD_SCHEDULE_TABLE_NAME] = self._schedule_table_updates(
+            snapshot.get(self.STANDARD_SCHEDULE_TABLE_NAME),
             self.STANDARD_SCHEDULE_TABLE_NAME,
             self._put_records_into_table_layout(
                 filter(lambda x: not x.absolute_start_time and not x.to_delete, records),
@@ -180,45 +251,64 @@ class GoogleScheduleTableService(ScheduleTableService):
         min_time = min((record.absolute_start_time or datetime.max for record in records))
         max_time = max((record.absolute_start_time or datetime.min for record in records))
 
-        if min_time == datetime.max or max_time == datetime.min:
-            return
-
-        weeks = math.ceil((max_time - min_time).days / 7)
-
-        monday = min_time - timedelta(days=min_time.weekday(),
-                                      hours=min_time.hour, minutes=min_time.minute, seconds=min_time.second)
-        saturday = monday + timedelta(days=7)
-
-        existing = await self._get_all_schedule_sheet_names()
-
-        for _ in range(weeks):
-            table_name = self.generate_table_name(monday)
+        if min_time != datetime.max and max_time != datetime.min:
+            weeks = math.ceil((max_time - min_time).days / 7)
+
+            monday = min_time - timedelta(days=min_time.weekday(),
+                                          hours=min_time.hour, minutes=min_time.minute, seconds=min_time.second)
+            saturday = monday + timedelta(days=7)
+
+            existing: set[str] | None = None
+
+            for _ in range(weeks):
+                table_name = self.generate_table_name(monday)
+
+                if table_name not in snapshot:
+                    existing = existing if existing is not None else await self._get_all_schedule_sheet_names()
+                    if table_name not in existing:
+                        await self.create_schedule_sheet_for_week(monday)
+
+                updates[table_name] = self._schedule_table_updates(
+                    snapshot.get(table_name),
+                    table_name,
+                    self._put_records_into_table_layout(
+                        filter(
+                            lambda x: (monday <= (x.absolute_start_time or datetime.max) <= saturday)
+                            and not x.to_delete,
+                            records
+                        ),
+                        first_column
+                    ),
+                    monday=monday
+                )
+                monday += timedelta(days=7)
+                saturday += timedelta(days=7)
 
-            if table_name not in existing:
-                await self.create_schedule_sheet_for_week(monday)
+        rewritten = frozenset(name for name, sheet_updates in updates.items() if sheet_updates)
+        if not rewritten:
+            return
 
-            await self._rewrite_schedule_table(
-                table_name,
-                self._put_records_into_table_layout(
-                    filter(
-                        lambda x: (monday <= (x.absolute_start_time or datetime.max) <= saturday) and not x.to_delete,
-                        records
-                    ),
-                    first_column
-                ),
-                monday=monday
-            )
-            monday += timedelta(days=7)
-            saturday += timedelta(days=7)
+        self._last_fingerprint = self._last_read = None
+        await self._gspread.values_batch_update(
+            self._gspread.gs_schedule_sheet, list(chain.from_iterable(updates.values())))
+        event_bus.publish(ScheduleChanged(rewritten))
 
     def _put_records_into_table_layout(self, records: Iterable[SpreadsheetScheduleRecord],
                                        first_column: list[str]) -> list[list[str]]:
-        res_dict: dict[str, list[str]] = {key: 7 * [''] for key in first_column}
+        res = [7 * [''] for _ in first_column]
+        cells: dict[SlotKey, tuple[list[str], int]] = {}
+        for row, raw_time in zip(res, first_column):
+            if "-" not in raw_time:
+                continue
+            time_start, time_end = raw_time.split("-")
+            for day in range(7):
+                cells[SlotKey.template(day, time_start, time_end)] = row, day
 
         for record in records:
-            res_dict[record.raw_time_start_time_end][record.day_of_the_week-1] = self._record_to_cell(record)
+            row, day = cells[SlotKey.template(record.day_of_the_week - 1, record.time_start, record.time_end)]
+            row[day] = self._record_to_cell(record)
 
-        return [res_dict[key] for key in first_column]
+        return res
 
     @staticmethod
     def _record_to_cell(record: SpreadsheetScheduleRecord) -> str:
@@ -227,19 +317,42 @@ class GoogleScheduleTableService(ScheduleTableService):
 
         return record.user_id
 
-    async def _rewrite_schedule_table(self, sheet_name: str, content: list[list[str]], monday: datetime | None = None):
-        worksheet = await self._gspread.get_schedule_worksheet(sheet_name)
-        update = [{
-            'range': 'B3:H' + str(2 + len(content)),
-            'values': content,
-        }]
+    def _schedule_table_updates(self, snapshot: list[list[str]] | None, sheet_name: str,
+                                content: list[list[str]], monday: datetime | None = None) -> list[dict]:
+        update = self._grid_updates(snapshot, sheet_name, 3, content)
         if monday:
             days_of_the_week = []
             for i in range(7):
                 days_of_the_week.append(monday.strftime('%d.%m.%Y'))
                 monday += timedelta(days=1)
-            update.append({
-                'range': 'B2:H2',
-                'values': [days_of_the_week]
-            })
-        worksheet.batch_update(update)
+            update += self._grid_updates(snapshot, sheet_name, 2, [days_of_the_week])
+        return update
+
+    @staticmethod
+    def _grid_updates(snapshot: list[list[str]] | None, sheet_name: str,
+                      first_row: int, rows: list[list[str]]) -> list[dict]:
+        # rows are written from column B, the snapshot holds the whole sheet starting from A1
+        if snapshot is None:
+            return [{
+                'range': absolute_range_name(sheet_name, f'B{first_row}:H{first_row + len(rows) - 1}'),
+                'values': rows,
+            }]
+
+        update = list[dict]()
+        for row_id, row in enumerate(rows, start=first_row):
+            old_row = snapshot[row_id - 1] if row_id - 1 < len(snapshot) else []
+            changed_from = None
+            for col_id, val in enumerate(row + [None], start=2):
+                old_val = old_row[col_id - 1] if col_id - 1 < len(old_row) else ''
+                if val is not None and val != old_val:
+                    changed_from = changed_from or col_id
+                    continue
+
+                if changed_from:
+                    update.append({
+                        'range': absolute_range_name(
+                            sheet_name, f'{rowcol_to_a1(row_id, changed_from)}:{rowcol_to_a1(row_id, col_id - 1)}'),
+                        'values': [row[changed_from - 2:col_id - 2]],
+                    })
+                    changed_from = None
+        return update
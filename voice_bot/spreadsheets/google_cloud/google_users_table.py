@@ -2,17 +2,21 @@ from datetime import timedelta
 from typing import Callable
 
 import structlog
-from injector import inject
+from injector import singleton, inject
 
 from voice_bot.constants import REMINDERS_OPTIONS
+from voice_bot.domain.events import SyncCompleted
 from voice_bot.domain.roles import BotRoles
-from voice_bot.misc import simple_cache
+from voice_bot.misc import simple_cache, event_bus
+from voice_bot.misc.fingerprint import fingerprint
 from voice_bot.misc.simple_cache import simplecache
 from voice_bot.spreadsheets.google_cloud.gspread import GspreadClient
+from voice_bot.spreadsheets.google_cloud.row_patches import row_patches, full_rewrite
 from voice_bot.spreadsheets.models.spreadsheet_user import SpreadsheetUser
 from voice_bot.spreadsheets.users_table import UsersTableService
 
 
+@singleton
 class GoogleUsersTableService(UsersTableService):
     @inject
     def __init__(self, gspread: GspreadClient):
@@ -23,7 +27,12 @@ class GoogleUsersTableService(UsersTableService):
 
     @staticmethod
     def delete_cache():
-        simple_cache.delete_key(self._TABLE_CACHE_KEY)
+        simple_cache.delete_key(GoogleUsersTableService._TABLE_CACHE_KEY)
+
+    @staticmethod
+    def subscribe_events():
+        # sync rewrites the sheet, the cached copy is stale after it
+        event_bus.subscribe(SyncCompleted, lambda e: GoogleUsersTableService.delete_cache())
 
     _USER_LAYOUT = {
         "Уникальное имя": "unique_id",
@@ -52,8 +61,9 @@ class GoogleUsersTableService(UsersTableService):
         return res
 
     async def _fetch_users_table_nocache(self) -> (dict[str, int], list[SpreadsheetUser]):
-        cells = (await self._gspread.get_settings_worksheet("Ученики")).get_values()
+        return self._parse_users(await self._gspread.get_values(await self._gspread.get_settings_worksheet("Ученики")))
 
+    def _parse_users(self, cells: list[list[str]]) -> (dict[str, int], list[SpreadsheetUser]):
         users = list[SpreadsheetUser]()
 
         layout = self._parse_layout(cells[:2])
@@ -83,7 +93,7 @@ class GoogleUsersTableService(UsersTableService):
 
         return layout, users
 
-    @simplecache(_TABLE_CACHE_KEY, timedelta(days=365))
+    @simplecache(_TABLE_CACHE_KEY, timedelta(days=365), persistent=True)
     async def _fetch_users_table(self) -> list[SpreadsheetUser]:
         _, users = await self._fetch_users_table_nocache()
         return users
@@ -131,10 +141,12 @@ class GoogleUsersTableService(UsersTableService):
         layout, users_reloaded = await self._fetch_users_table_nocache()
         reloaded_user = next(filter(lambda x: x.unique_id == user.unique_id, users_reloaded))
 
+        self._last_fingerprint = self._last_revision = None
         real_row = reloaded_user.row_id + 3
         resulting_array = self._to_table_row(layout, user)
 
-        self._gspread.gs_settings_sheet.worksheet("Ученики").batch_update(
+        await self._gspread.batch_update(
+            await self._gspread.get_settings_worksheet("Ученики"),
             [{
                 'range': f'A{real_row}:Z{real_row}',
                 'values': [resulting_array],
@@ -160,23 +172,42 @@ class GoogleUsersTableService(UsersTableService):
 
     _last_layout = None
 
+    _last_rows: list[list[str]] | None = None
+
+    _last_fingerprint: str | None = None
+
+    _last_cells: list[list[str]] | None = None
+
+    _last_revision: str | None = None
+
+    def content_fingerprint(self) -> str | None:
+        return self._last_fingerprint
+
     async def dump_records(self, **kwargs) -> list[SpreadsheetUser]:
-        layout, users = await self._fetch_users_table_nocache()
+        # the sheet is read again only if the spreadsheet was edited since the last read
+        revision = await self._gspread.revision(self._gspread.gs_settings_sheet)
+        if self._last_cells is None or revision != self._last_revision:
+            self._last_cells = await self._gspread.get_values(await self._gspread.get_settings_worksheet("Ученики"))
+            self._last_revision = revision
+
+        cells = self._last_cells
+        layout, users = self._parse_users(cells)
         self._last_layout = layout
+        self._last_rows = cells[2:]
+        self._last_fingerprint = fingerprint(cells)
         return users
 
     async def rewrite_all_records(self, records: list[SpreadsheetUser]):
         records.sort(key=lambda x: x.unique_id)
 
         rows = [self._to_table_row(self._last_layout, user) for user in filter(lambda x: not x.to_delete, records)]
-        worksheet = await self._gspread.get_settings_worksheet("Ученики")
 
-        worksheet.batch_update(
-            [{
-                'range': f'A3:Z{len(rows) + 2}',
-                'values': rows,
-            }, {
-                'range': f'A{len(rows) + 3}:Z1000',
-                'values': (1000 - len(rows) - 2) * [26 * ['']]
-            }]
-        )
+        old_rows, self._last_rows = self._last_rows, None
+        update = full_rewrite(rows, 3) if old_rows is None \
+            else row_patches(old_rows, rows, 3, self._last_layout["unique_id"])
+        if not update:
+            return
+
+        self._last_fingerprint = self._last_revision = None
+        worksheet = await self._gspread.get_settings_worksheet("Ученики")
+        await self._gspread.batch_update(worksheet, update)
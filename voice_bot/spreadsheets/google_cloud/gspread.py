@@ -1,33 +1,139 @@
+import asyncio
+import time
 from datetime import timedelta, datetime
+from typing import Callable, TypeVar
 
 import gspread
-from gspread import Worksheet
+from gspread import Worksheet, Spreadsheet
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import absolute_range_name, fill_gaps, ValueInputOption
 from injector import singleton, inject
 
-from voice_bot.misc.simple_cache import simplecache
+from voice_bot.misc.quota_scheduler import QuotaScheduler, TokenBucket
 from voice_bot.voice_bot_configurator import VoiceBotConfigurator
 
+R = TypeVar('R')
+
+_METADATA_MAX_AGE = timedelta(hours=1)
+
+
+def _is_retryable(e: Exception) -> bool:
+    return isinstance(e, APIError) and (e.response.status_code == 429 or e.response.status_code >= 500)
+
+
+def _is_throttled(e: Exception) -> bool:
+    return isinstance(e, APIError) and e.response.status_code == 429
+
 
 @singleton
 class GspreadClient:
     @inject
     def __init__(self, conf: VoiceBotConfigurator):
-        gs = gspread.service_account(filename=conf.google_token_path)
         self._conf = conf
-        self.gs_settings_sheet = gs.open_by_url(conf.google_settings_table_link)
-        self.gs_schedule_sheet = gs.open_by_url(conf.google_schedule_table_link)
+        self._scheduler = QuotaScheduler(
+            "gspread",
+            reads=TokenBucket(conf.google_reads_per_minute),
+            writes=TokenBucket(conf.google_writes_per_minute),
+            workers=conf.google_workers,
+            interactive_workers=conf.google_interactive_workers,
+            timeout=conf.google_call_timeout,
+            retryable=_is_retryable,
+            retryable_write=_is_throttled,
+        )
+        self.gs_settings_sheet, self.gs_schedule_sheet = self._open_spreadsheets(conf)
+        # spreadsheet id -> (fetched at, sheet title -> sheet properties)
+        self._sheets = dict[str, tuple[float, dict[str, dict]]]()
+        self._loading = dict[str, asyncio.Future]()
+
+    def _open_spreadsheets(self, conf: VoiceBotConfigurator) -> (Spreadsheet, Spreadsheet):
+        gs = gspread.service_account(filename=conf.google_token_path)
+        return gs.open_by_url(conf.google_settings_table_link), gs.open_by_url(conf.google_schedule_table_link)
+
+    async def run(self, func: Callable[..., R], *args, write: bool = False, **kwargs) -> R:
+        # gspread is blocking, calls run in the scheduler's pools so the bot keeps answering updates meanwhile
+        return await self._scheduler.run(func, *args, write=write, **kwargs)
+
+    async def sheet_properties(self, spreadsheet: Spreadsheet, refresh: bool = False) -> dict[str, dict]:
+        """Sheet title -> sheet properties (id, index, grid size), one metadata request per refresh."""
+        fetched_at, sheets = self._sheets.get(spreadsheet.id, (0, None))
+        if refresh or sheets is None or time.monotonic() - fetched_at > _METADATA_MAX_AGE.total_seconds():
+            # concurrent callers share the request already in flight
+            if spreadsheet.id not in self._loading:
+                self._loading[spreadsheet.id] = asyncio.ensure_future(self._load_sheet_properties(spreadsheet))
+            sheets = await asyncio.shield(self._loading[spreadsheet.id])
+        return sheets
+
+    async def _load_sheet_properties(self, spreadsheet: Spreadsheet) -> dict[str, dict]:
+        try:
+            metadata = await self.run(spreadsheet.fetch_sheet_metadata)
+        finally:
+            del self._loading[spreadsheet.id]
+        sheets = {sheet["properties"]["title"]: sheet["properties"] for sheet in metadata["sheets"]}
+        self._sheets[spreadsheet.id] = time.monotonic(), sheets
+        return sheets
+
+    async def revision(self, spreadsheet: Spreadsheet) -> str:
+        """Drive modifiedTime of the spreadsheet, every edit changes it, the bot's own ones too."""
+        return await self.run(spreadsheet.get_lastUpdateTime)
+
+    async def get_worksheet(self, spreadsheet: Spreadsheet, name: str) -> Worksheet:
+        properties = (await self.sheet_properties(spreadsheet)).get(name)
+        if properties is None:
+            # the sheet may have been added by hand after the last fetch
+            properties = (await self.sheet_properties(spreadsheet, refresh=True)).get(name)
+        if properties is None:
+            raise WorksheetNotFound(name)
+        return Worksheet(spreadsheet, properties)
 
-    @simplecache("gspread_settings_worksheet", timedelta(days=365))
     async def get_settings_worksheet(self, name: str) -> Worksheet:
-        return self.gs_settings_sheet.worksheet(name)
+        return await self.get_worksheet(self.gs_settings_sheet, name)
 
-    @simplecache("gspread_schedule_worksheet", timedelta(days=365))
     async def get_schedule_worksheet(self, name: str) -> Worksheet:
-        return self.gs_schedule_sheet.worksheet(name)
+        return await self.get_worksheet(self.gs_schedule_sheet, name)
+
+    async def get_values(self, worksheet: Worksheet) -> list[list[str]]:
+        return await self.run(worksheet.get_values)
+
+    async def batch_get_values(self, spreadsheet: Spreadsheet, sheet_names: list[str]) -> list[list[list[str]]]:
+        # padded the same way Worksheet.get_values pads its result
+        response = await self.run(spreadsheet.values_batch_get, [absolute_range_name(name) for name in sheet_names])
+        return [fill_gaps(value_range.get("values", [])) for value_range in response["valueRanges"]]
+
+    async def col_values(self, worksheet: Worksheet, col: int) -> list[str]:
+        return await self.run(worksheet.col_values, col)
+
+    async def update(self, worksheet: Worksheet, range_name: str, values: list[list[str]]):
+        await self.run(worksheet.update, range_name, values, write=True)
+
+    async def batch_update(self, worksheet: Worksheet, data: list[dict]):
+        await self.run(worksheet.batch_update, data, write=True)
+
+    async def values_batch_update(self, spreadsheet: Spreadsheet, data: list[dict]):
+        # same input option Worksheet.batch_update uses by default
+        await self.run(
+            spreadsheet.values_batch_update, body={"valueInputOption": ValueInputOption.raw, "data": data}, write=True)
+
+    async def duplicate(self, worksheet: Worksheet, **kwargs) -> Worksheet:
+        new_worksheet: Worksheet = await self.run(worksheet.duplicate, write=True, **kwargs)
+
+        _, sheets = self._sheets.get(worksheet.spreadsheet.id, (0, None))
+        if sheets is not None:
+            for properties in sheets.values():
+                if properties["index"] >= new_worksheet.index:
+                    properties["index"] += 1
+            sheets[new_worksheet.title] = {
+                "sheetId": new_worksheet.id,
+                "title": new_worksheet.title,
+                "index": new_worksheet.index,
+                "gridProperties": {"rowCount": new_worksheet.row_count, "columnCount": new_worksheet.col_count},
+            }
+        return new_worksheet
 
     async def get_link_to_schedule_worksheet(self, week: datetime) -> str:
         monday = week - timedelta(days=week.weekday())
         saturday = monday + timedelta(days=6)
         ws_name = f"{monday.strftime('%d.%m')}-{saturday.strftime('%d.%m')}"
-        return self._conf.google_schedule_table_link + "#gid=" + str((await self.get_schedule_worksheet(ws_name)).id)
-
+        properties = await self.sheet_properties(self.gs_schedule_sheet)
+        if ws_name not in properties:
+            properties = await self.sheet_properties(self.gs_schedule_sheet, refresh=True)
+        return self._conf.google_schedule_table_link + "#gid=" + str(properties[ws_name]["sheetId"])
@@ -0,0 +1,63 @@
+from gspread.utils import rowcol_to_a1
+
+SHEET_WIDTH = 26
+
+_SHEET_HEIGHT = 1000
+
+
+def full_rewrite(rows: list[list[str]], first_row: int) -> list[dict]:
+    return [{
+        'range': f'A{first_row}:Z{len(rows) + first_row - 1}',
+        'values': rows,
+    }, {
+        'range': f'A{len(rows) + first_row}:Z{_SHEET_HEIGHT}',
+        'values': (_SHEET_HEIGHT - len(rows) - first_row + 1) * [SHEET_WIDTH * ['']]
+    }]
+
+
+def row_patches(old_rows: list[list[str]], rows: list[list[str]], first_row: int, key_col: int) -> list[dict]:
+    """
+    Batch update ranges turning old_rows into rows, both starting at first_row.
+    Rows are matched with the old ones by the key column, a None cell keeps the value the sheet has for its record.
+    Every row is patched cell by cell against what is at its position, so a record that stayed in place is written
+    only where it changed. The records are sorted, values cannot be moved: a record added or removed above
+    shifts the rows below it and those are written over in the cells that differ from their new neighbours.
+    """
+    res = list[dict]()
+    old_rows = [row[:SHEET_WIDTH] + (SHEET_WIDTH - len(row)) * [''] for row in old_rows]
+    old_by_key = {row[key_col]: row for row in old_rows if row[key_col]}
+
+    for i, row in enumerate(rows):
+        row_id = first_row + i
+        old_row = old_rows[i] if i < len(old_rows) else SHEET_WIDTH * ['']
+
+        if old_row[key_col] != row[key_col]:
+            # the record moved here or is new, unknown cells take what the sheet had for it
+            record_row = old_by_key.get(row[key_col], SHEET_WIDTH * [''])
+            row = [record_row[col] if val is None else val for col, val in enumerate(row)]
+
+        # in a row of the same record None is the value the sheet already has, it never differs
+        changed_from = None
+        for col, (old_val, val) in enumerate(zip(old_row + [''], row + [None])):
+            if val is not None and old_val != val:
+                changed_from = col if changed_from is None else changed_from
+                continue
+
+            if changed_from is not None:
+                res.append({
+                    'range': f'{rowcol_to_a1(row_id, changed_from + 1)}:{rowcol_to_a1(row_id, col)}',
+                    'values': [row[changed_from:col]],
+                })
+                changed_from = None
+
+    vacated = old_rows[len(rows):]
+    while vacated and not any(vacated[-1]):
+        vacated.pop()
+    if vacated:
+        start, end = first_row + len(rows), first_row + len(rows) + len(vacated) - 1
+        res.append({
+            'range': f'A{start}:{rowcol_to_a1(end, SHEET_WIDTH)}',
+            'values': len(vacated) * [SHEET_WIDTH * ['']],
+        })
+
+    return res
@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from datetime import timedelta, datetime
 
 from voice_bot.telegram_bot.base_handler import BaseScheduleHandler
+from voice_bot.telegram_bot.handlers.cron_cache_snapshot import CronCacheSnapshot
 from voice_bot.telegram_bot.handlers.cron_daily_cleanup import CronDailyCleanup
 from voice_bot.telegram_bot.handlers.cron_lesson_generator import CronLessonGenerator
 from voice_bot.telegram_bot.handlers.cron_lesson_logger import CronLessonLogger
@@ -42,5 +43,10 @@ CRON_JOBS: dict[str, CronJob] = {
         handler=CronLessonLogger,
         interval=timedelta(hours=1),
         first=datetime(2023, 1, 1, 0, 0)
+    ),
+    "cache_snapshot": CronJob(
+        handler=CronCacheSnapshot,
+        interval=timedelta(minutes=10),
+        first=datetime(2023, 1, 1, 0, 0)
     )
 }
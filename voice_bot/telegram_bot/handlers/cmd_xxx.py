@@ -50,8 +50,10 @@ class CmdXxx(BaseUpdateHandler):
             return
 
         match context.args[0]:
+            case "sync" if context.args[1:] == ["dry"]: await self._dry_sync(update)
             case "sync": await self._perform_sync(update)
             case "day_reminders": await self._turn_on_day_reminders(update)
+            case "cache_stats": await self._cache_stats(update)
             case "spam": await self._users.send_text_message_to_roles(
                 " ".join(context.args[1:]), {UserRoles.sysadmin}, send_as_is=True)
             case "test_cancel": await self._users.send_menu_to_user("242173251", REMINDER_TREE, {
@@ -120,10 +122,28 @@ class CmdXxx(BaseUpdateHandler):
         return report
 
     async def _perform_sync(self, update: Update):
-        self._cache.clear_all_cache()
         await self._sync.sync_only_users()
         await update.effective_message.reply_text("готово")
 
+    async def _dry_sync(self, update: Update):
+        dry = await self._sync.dry_run()
+        report = [f"синк сделал бы {dry.plan.size} изменений "
+                  f"(чтение {dry.load_time:.2f}s, план {dry.plan_time * 1000:.1f}ms):"]
+        report += dry.plan.describe()
+        await update.effective_message.reply_text("\n".join(report))
+
+    async def _cache_stats(self, update: Update):
+        report = []
+        for stats in self._cache.get_stats():
+            avg_load = stats.load_time / stats.loads * 1000 if stats.loads else 0
+            report.append(
+                f"{stats.prefix}: hit {stats.hits}/{stats.hits + stats.misses} ({stats.hit_rate:.0%}), "
+                f"loads {stats.loads} (avg {avg_load:.0f}ms, coalesced {stats.coalesced}), "
+                f"expired {stats.expirations}, evicted {stats.evictions}, "
+                f"entries {stats.entries} (~{stats.approx_bytes / 1024:.1f}KB)"
+            )
+        await update.effective_message.reply_text("\n".join(report) or "кэш пустой")
+
     async def _turn_on_day_reminders(self, update: Update):
         users = await self._users.get_all_regular_users()
         for user in users:
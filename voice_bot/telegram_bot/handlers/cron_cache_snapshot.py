@@ -0,0 +1,16 @@
+from injector import inject
+from telegram.ext import ContextTypes
+
+from voice_bot.domain.services.cache_service import CacheService
+from voice_bot.telegram_bot.base_handler import BaseScheduleHandler
+from voice_bot.telegram_di_scope import telegramupdate
+
+
+@telegramupdate
+class CronCacheSnapshot(BaseScheduleHandler):
+    @inject
+    def __init__(self, cache: CacheService):
+        self._cache = cache
+
+    async def handle(self, context: ContextTypes.DEFAULT_TYPE):
+        await self._cache.save_snapshot()
@@ -1,6 +1,7 @@
 from injector import inject
 from telegram.ext import ContextTypes
 
+from voice_bot.misc import simple_cache
 from voice_bot.telegram_bot.base_handler import BaseScheduleHandler
 from voice_bot.telegram_bot.navigation.misc.callback_data_codec import CallbackDataCodec
 from voice_bot.telegram_di_scope import telegramupdate
@@ -14,3 +15,4 @@ class CronDailyCleanup(BaseScheduleHandler):
 
     async def handle(self, context: ContextTypes.DEFAULT_TYPE):
         self._callback_codec.clear_old()
+        simple_cache.sweep_cache()
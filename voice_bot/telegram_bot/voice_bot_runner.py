@@ -8,6 +8,8 @@ from structlog.contextvars import bound_contextvars
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler, MessageHandler, filters
 
+from voice_bot.domain.services.cache_service import CacheService
+from voice_bot.misc.quota_scheduler import background_lane
 from voice_bot.misc.stopwatch import Stopwatch
 from voice_bot.telegram_bot.commands import COMMANDS, CommandDefinition, CommandWithMenuDefinition
 from voice_bot.telegram_bot.cron_jobs import CronJob, CRON_JOBS
@@ -27,15 +29,21 @@ class VoiceBotRunner:
             configuration: VoiceBotConfigurator,
             injector: Injector,
             middleware: TelegramUpdateScopeDecorator,
-            tg_bot_proxy: TelegramBotProxy
+            tg_bot_proxy: TelegramBotProxy,
+            cache: CacheService
     ):
         self._logger = structlog.get_logger(class_name=__class__.__name__)
 
+        self._cache = cache
+
         self._middleware = middleware
 
         self._injector = injector
 
-        self._application = Application.builder().token(configuration.telegram_bot_token).build()
+        self._application = Application.builder().token(configuration.telegram_bot_token) \
+            .post_init(self._post_init) \
+            .post_shutdown(self._post_shutdown) \
+            .build()
 
         self._wire_commands()
         self._wire_callback_handler()
@@ -47,6 +55,12 @@ class VoiceBotRunner:
     def start_bot(self) -> None:
         self._application.run_polling()
 
+    async def _post_init(self, application: Application) -> None:
+        await self._cache.load_snapshot()
+
+    async def _post_shutdown(self, application: Application) -> None:
+        await self._cache.save_snapshot()
+
     def _wire_commands(self) -> None:
         for name, cmd in COMMANDS.items():
             wrapper = _HandlerWrapper(name, cmd, self._injector, self._logger)
@@ -162,7 +176,7 @@ class _CronHandlerWrapper:
     async def handle(self, context: ContextTypes.DEFAULT_TYPE):
         self._stopwatch.start()
 
-        with bound_contextvars(local_request_id=str(uuid.uuid4())):
+        with bound_contextvars(local_request_id=str(uuid.uuid4())), background_lane():
             try:
                 await self._logger.debug("Cron started", cron=json.dumps(self._cron_def, default=str))
                 handler = self._injector.get(self._cron_def.handler, _TelegramUpdate)
@@ -28,14 +28,30 @@ class VoiceBotConfigurator:
 
             self.db_connection_str = configs["db_conn_str"]
 
+            self.google_fake = configs["google"].get("fake")
+            if self.google_fake:
+                self.google_fake["data_path"] = configs_path.parent / self.google_fake["data_path"]
+
             self._injector_bind_google_sheets()
+            self._subscribe_events()
             self.google_token_path = configs_path.parent / configs["google"]["token_path"]
             self.google_settings_table_link = configs["google"]["table_settings_link"]
             self.google_schedule_table_link = configs["google"]["table_schedule_link"]
+            self.google_workers = configs["google"].get("workers", 4)
+            self.google_interactive_workers = configs["google"].get("interactive_workers", 2)
+            self.google_call_timeout = configs["google"].get("call_timeout_seconds", 60)
+            self.google_reads_per_minute = configs["google"].get("reads_per_minute", 60)
+            self.google_writes_per_minute = configs["google"].get("writes_per_minute", 60)
 
             configure_logger(configs["log_folder"])
 
+            self.cache_snapshot_path = configs_path.parent / configs["cache_snapshot_path"] \
+                if "cache_snapshot_path" in configs else None
+
             self.calendar_email = configs["calendar_email"]
+            self.calendar_requests_per_minute = configs.get("calendar_requests_per_minute", 300)
+            self.calendar_workers = configs.get("calendar_workers", 2)
+            self.calendar_interactive_workers = configs.get("calendar_interactive_workers", 1)
             self.oauth_credentials = configs_path.parent / configs["oauth_credentials"]
 
     def _injector_bind_google_sheets(self):
@@ -46,4 +62,20 @@ class VoiceBotConfigurator:
         from voice_bot.spreadsheets.google_cloud.google_schedule_table import GoogleScheduleTableService
         self._injector.binder.bind(ScheduleTableService, GoogleScheduleTableService)
         from voice_bot.spreadsheets.google_cloud.google_admins_table import GoogleAdminsTableService
-        self._injector.binder.bind(AdminsTableService, GoogleAdminsTableService)
\ No newline at end of file
+        self._injector.binder.bind(AdminsTableService, GoogleAdminsTableService)
+        if self.google_fake:
+            from voice_bot.spreadsheets.google_cloud.fake_gspread import FakeGspreadClient
+            from voice_bot.spreadsheets.google_cloud.gspread import GspreadClient
+            self._injector.binder.bind(GspreadClient, FakeGspreadClient)
+
+    @staticmethod
+    def _subscribe_events():
+        # cached copies are dropped when the services publish changes to what they were read from
+        from voice_bot.domain.services.principals_service import PrincipalsService
+        PrincipalsService.subscribe_events()
+        from voice_bot.spreadsheets.google_cloud.google_params_table import GoogleParamsTableService
+        GoogleParamsTableService.subscribe_events()
+        from voice_bot.spreadsheets.google_cloud.google_users_table import GoogleUsersTableService
+        GoogleUsersTableService.subscribe_events()
+        from voice_bot.spreadsheets.google_cloud.google_schedule_table import GoogleScheduleTableService
+        GoogleScheduleTableService.subscribe_events()